@@ -160,7 +160,7 @@ def directmethod(initialspecies_list,reconstant_list,t1_list):
         print("Error: negative propensities.")     
 
     if sum(prob_list)!=0:                              # if sum of prob_list is not 0, which  means system does not
-        u=random.choice(np.arange(0,5),p=prob_list)    # reach equilibrium, choose which reaction will occur according to their
+        u=random.choice(5,p=prob_list)                 # reach equilibrium, choose which reaction will occur according to their
         tau=random.exponential(1/sumprop)              # probablity distribution as well as choose the occurrance time of the
                                                        # selected reaction according to the exponential with parameter sumprop
         if u==0:
@@ -220,7 +220,7 @@ def window(t1,t2,t1_list,n):
     return index_x
 
 
-def stimulation(x,t1,t2):
+def stimulation(x,t1,t2,stop=None):
     '''Stimulate the reactions during a given time period from t1 to t2
     
     parameters
@@ -232,20 +232,30 @@ def stimulation(x,t1,t2):
       initial time
     t2: int
       ending time
+    stop: function (optional)
+      stop(species_list, t, nfired) is called on the initial state and after each reaction step with the molecular
+      numbers, the reaction time and the number of reactions occurred so far; the stimulation stops as soon as it
+      returns True (if it is True at t1, no reaction step is run and t1 is the hitting time)
     
     Returns
     -------
     out: tuple with 4 elements
        first element:the molecular number of 7 chemical species when system reaches equilibrium
-       second element:the time that system reaches equilibrium
+                     (or the hitting state if stop returned True, or the state at t2 if t2 is reached first)
+       second element:the time that system reaches equilibrium (or the hitting time if stop returned True,
+                      or t2 if t2 is reached first)
        third element: list that store the updating time after each reaction step (while loop)
        forth element: list that store the updating molecular number of 7 chemical species at each reaction step (while loop)
     '''
     
     t0=t1      # use t0 to store the initial value of t1 (stimulation starting time)
+    initial_list=x[0]   # use initial_list to store the initial molecular number of chemical species
     t1_list=[]   # will be used to store the updating reaction time t1
     chemical_list=[]  # will be used to store the list that store the updating molecular number of 7 chemical species
     
+    if stop is not None and stop(x[0],t1,0):   # the initial state is already the hitting state
+        return x[0], t1, t1_list, chemical_list
+    
     while t1<t2:
         y=directmethod(x[0],x[1],t1_list)
         if y[3]==False:    # if in_equilibrium is still false, it means the system does not reach equilibrium
@@ -254,16 +264,28 @@ def stimulation(x,t1,t2):
             t1_list.append(t1)  # store the reaction time t1 into t1_list
             chemical_list.append(x[0])  # store the list that store the updating molecular number of chemical species into
                                         # chemical_list
+            if stop is not None and t1<=t2 and stop(x[0],t1,len(t1_list)):   # the stop condition is reached (a step after
+                equilstate=x[0]                                               # t2 does not count): the current state and
+                                                                              # time are the hitting state and time
+                equiltime=t1
+                break
         
         else:                               # if in_equilibrium is true, it means the system has reached equilibrium
             equilstate=chemical_list[-1]    # the molecular number of chemicals and time at equilibrium should be the same 
             equiltime=t1_list[-1]           # as "if" terminates. 
             break
+    
+    else:                                   # if t2 is reached first (not in equilibrium, stop condition not reached), the
+        if len(chemical_list)>1:            # last reaction step has occurred after t2, so the state at t2 is the one
+            equilstate=chemical_list[-2]    # before it
+        else:
+            equilstate=initial_list
+        equiltime=t2
         
     return equilstate, equiltime, t1_list, chemical_list
     
 
-def repeat(x,t1,t2,m,n):
+def repeat(x,t1,t2,m,n,stop=None):
     '''Run the stimulation certain times.
     
     parameters
@@ -279,6 +301,8 @@ def repeat(x,t1,t2,m,n):
       how many even time intervals we would like to get from t1 to t2
     n: int
       how many times we would like to run the stimulation
+    stop: function (optional)
+      stop condition passed to stimulation
       
     Returns
     -------
@@ -290,8 +314,11 @@ def repeat(x,t1,t2,m,n):
     n0=1
     
     while n0<=n:
-        y=stimulation(x,t1,t2)    # run the stimulation
-        w=window(t1,y[1],y[2],m)  # divide the time from initial time to time that reach equilibrium into m parts, and 
+        y=stimulation(x,t1,t2,stop)    # run the stimulation
+        if len(y[2])==0:          # the stop condition is reached at the initial state: no reaction step has occurred
+            w=[0]*(m-1)
+        else:
+            w=window(t1,y[1],y[2],m)  # divide the time from initial time to time that reach equilibrium into m parts, and 
         window_list=[]            # get the index of the first element in reaction occurrance time list between each 
                                   # certain time intervals
         for i in w:
@@ -107,7 +107,7 @@ class System(object):
                             # return tau as 0.
             
         if sum(prob_list)!=0:                             # update h~n using Directmethod.    
-            u=random.choice(np.arange(0,5),p=prob_list)   
+            u=random.choice(5,p=prob_list)   
             tau=random.exponential(1/sumprop)
         
             if u==0:
@@ -128,8 +128,11 @@ class System(object):
 
         
         
-    def simulate(self,end_time):
-        '''Stimulate the reactions during a given time period from start_time to end_time'''
+    def simulate(self,end_time,stop=None):
+        '''Stimulate the reactions during a given time period from start_time to end_time
+        
+        stop(chemcount_list, t, nfired) is an optional stop condition called on the initial state and after each reaction
+        step; if it returns True the simulation stops and the last elements of the results are the hitting time and state'''
         
         t0=0
         t_list=[]
@@ -137,9 +140,14 @@ class System(object):
         totalcount_list=[] 
         
         equilibrium=False
-  
-        chem_list=[]
-    
+        
+        if stop is not None:     # the initial state may already be the hitting state
+            chemical_set=set()
+            for i in self.reaction_list:
+                chemical_set.update(i.reactant_list)
+            chemcount_list=[i.count for i in sorted(chemical_set,key=lambda x: x.name)]
+            if stop(chemcount_list,t0,0):
+                return np.array([t0]), np.array([chemcount_list]), equilibrium
        
         while t0<end_time:   
             species_list, t, equilibrium=self.run_directmethod() 
@@ -147,12 +155,13 @@ class System(object):
             if t!=0:  
                 t0+=t  
                 t_list.append(t0)
-                chem_list.append(species_list) 
                     
                 chemcount_list=[]   # after each round of run_directmethod, store the updated molecular count of chemical
                 for i in species_list:   # species into chemcount_list
                     chemcount_list.append(i.count)
                 totalcount_list.append(chemcount_list)      # store the chemcount_list into totalcount_list
+                if stop is not None and t0<=end_time and stop(chemcount_list,t0,len(t_list)):   # not a step after end_time
+                    break
 
             else: # t=0 means sum(prob_list)==0, the system has reached equilibrium
                 equilibrium=True
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Ensembles and parameter sweeps of the Gibson et al system distributed over several hosts
+Python 3
+
+"""
+
+
+
+import os
+import time
+import threading
+import numpy as np
+from multiprocessing.managers import BaseManager
+from gibson import gibsonmodel, loadscript
+
+
+# the workers run their batches with the vectorized First Reaction Method
+firstreactionensemble=loadscript('9. Gibson Vectorized First Reaction Method.py').firstreactionensemble
+
+
+
+class WorkQueue(object):
+    '''define the class of the work queue kept by the coordinator
+
+    The trajectories of every job (one set of reaction constants) are cut into batches with their
+    own seeds. A batch handed to a worker is leased for lease seconds; if its result has not come
+    back by then (the worker was lost) the batch is handed out again. The aggregates (number of
+    trajectories, sum and sum of squares of the states) of the first result of each batch are merged.'''
+
+    def __init__(self, job_list, t2, m, n, batchsize=100, seed=0, lease=60.0):
+        self.job_list=[(list(initial),list(reconstant)) for initial,reconstant in job_list]
+        self.t2=t2
+        self.m=m
+        self.lock=threading.Lock()
+        self.lease=lease
+
+        self.batch_list=[]               # (batch id, job index, number of trajectories, seed)
+        for j in range(len(job_list)):
+            for first in range(0,n,batchsize):
+                self.batch_list.append((len(self.batch_list),j,min(batchsize,n-first),seed+j*n+first))
+        self.pending=list(range(len(self.batch_list)))[::-1]    # batches never handed out, popped from the end
+        self.leased={}                   # batch id: (worker, deadline)
+        self.done=set()
+
+        nspecies=len(self.job_list[0][0])
+        self.count=np.zeros(len(job_list),dtype=np.int64)
+        self.total=np.zeros((len(job_list),m,nspecies))
+        self.totalsq=np.zeros((len(job_list),m,nspecies))
+
+
+    def getbatch(self, worker):
+        '''give the next batch to a worker; None when every batch is done, 'wait' when all the
+        remaining batches are leased to other workers'''
+        with self.lock:
+            if len(self.done)==len(self.batch_list):
+                return None
+            now=time.time()
+            if self.pending:
+                b=self.pending.pop()
+            else:
+                expired=[b for b,(w,deadline) in self.leased.items() if deadline<now]
+                if not expired:
+                    return 'wait'
+                b=min(expired)           # reissue a batch whose worker has been lost
+            self.leased[b]=(worker,now+self.lease)
+            bid,j,n,seed=self.batch_list[b]
+            initial,reconstant=self.job_list[j]
+            return {'batch':bid,'initial':initial,'reconstant':reconstant,
+                    't2':self.t2,'m':self.m,'n':n,'seed':seed}
+
+
+    def putresult(self, batch, count, total, totalsq):
+        '''merge the aggregates of a finished batch (a result for a batch already done is ignored)'''
+        with self.lock:
+            if batch in self.done:
+                return False
+            j=self.batch_list[batch][1]
+            self.count[j]+=count
+            self.total[j]+=total
+            self.totalsq[j]+=totalsq
+            self.done.add(batch)
+            self.leased.pop(batch,None)
+            return True
+
+
+    def progress(self):
+        '''give the number of batches done and the total number of batches'''
+        with self.lock:
+            return len(self.done), len(self.batch_list)
+
+
+    def statistics(self):
+        '''give the number of trajectories, the mean and the variance of the states of each job so far'''
+        with self.lock:
+            count=self.count.copy()
+            n=np.maximum(count,1)[:,None,None]
+            mean=self.total/n
+            variance=self.totalsq/n-mean**2
+            return count, mean, variance*n/np.maximum(n-1,1)
+
+
+
+class CoordinatorManager(BaseManager):
+    '''manager serving the work queue to the workers over TCP
+
+    register() changes the class for every instance, so coordinator() registers its work queue on a
+    subclass of its own: several coordinators can run in one process.'''
+
+
+
+class WorkerManager(BaseManager):
+    '''manager connecting a worker to the work queue of the coordinator'''
+
+
+
+def coordinator(job_list, t2, m, n, address=('127.0.0.1',50000), authkey=None, batchsize=100, seed=0, lease=60.0):
+    '''Start serving a work queue in a background thread
+
+    parameters
+    ----------
+    job_list: list
+      list of (initialspecies_list, reconstant_list), one job per parameter set of the sweep
+    t2: float
+      ending time
+    m: int
+      number of evenly spaced time points from 0 to t2 at which the state is recorded
+    n: int
+      number of trajectories of each job
+    address: tuple
+      (host, port) to listen on; port 0 chooses a free port. Only the local host by default: the
+      manager exchanges pickles, so whoever can connect with the key can run code on the coordinator.
+      Listen on another interface only on a trusted network.
+    authkey: bytes
+      key shared with the workers; a random key is generated if not given
+    batchsize: int
+      number of trajectories in each batch
+    seed: int
+      seed of the first trajectory; every trajectory of the sweep has its own seed
+    lease: float
+      seconds after which a batch handed to a worker is reissued
+
+    Returns
+    -------
+    out: tuple with 4 elements
+       first element: WorkQueue
+            the work queue (use progress() and statistics() to follow the sweep)
+       second element: tuple
+            the address the coordinator listens on
+       third element: bytes
+            the key to give to the workers
+       fourth element: function
+            call it to stop serving
+    '''
+
+    if authkey is None:
+        authkey=os.urandom(32)
+    queue=WorkQueue(job_list,t2,m,n,batchsize,seed,lease)
+    class QueueManager(CoordinatorManager):
+        pass
+    QueueManager.register('workqueue',callable=lambda: queue)
+    manager=QueueManager(address=address,authkey=authkey)
+    server=manager.get_server()
+    thread=threading.Thread(target=server.serve_forever,daemon=True)
+    thread.start()
+
+    def shutdown():
+        server.stop_event.set()
+        server.listener.close()
+    return queue, server.address, authkey, shutdown
+
+
+def waitfor(queue, poll=0.1, timeout=None):
+    '''Wait until every batch of the work queue is done, then give its statistics()'''
+    start=time.time()
+    while True:
+        done,total=queue.progress()
+        if done==total:
+            return queue.statistics()
+        if timeout is not None and time.time()-start>timeout:
+            raise TimeoutError("{0} of {1} batches done".format(done,total))
+        time.sleep(poll)
+
+
+def worker(address, authkey, name=None, reactant_matrix=None, change_matrix=None, poll=0.5):
+    '''Run batches handed out by the coordinator at address (authenticated with its authkey) until the work queue is finished
+
+    Returns
+    -------
+    out: int
+       number of batches this worker has run
+    '''
+
+    if reactant_matrix is None:
+        reactant_matrix, change_matrix=gibsonmodel()
+    WorkerManager.register('workqueue')
+    manager=WorkerManager(address=tuple(address),authkey=authkey)
+    manager.connect()
+    queue=manager.workqueue()
+    name=name or '{0}'.format(id(manager))
+
+    nbatch=0
+    while True:
+        batch=queue.getbatch(name)
+        if batch is None:
+            return nbatch
+        if batch=='wait':
+            time.sleep(poll)
+            continue
+        state=firstreactionensemble(batch['initial'],batch['reconstant'],batch['t2'],batch['m'],batch['n'],
+                                    batch['seed'],reactant_matrix,change_matrix)[1].astype(float)
+        queue.putresult(batch['batch'],len(state),state.sum(axis=0),(state**2).sum(axis=0))
+        nbatch+=1
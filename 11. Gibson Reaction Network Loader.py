@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+Load reaction networks from text files or SBML, with the compiled model cached on disk
+Python 3
+
+"""
+
+
+
+import os
+import re
+import hashlib
+import zipfile
+import xml.etree.ElementTree as ET
+import numpy as np
+from gibson import loadscript
+
+
+CACHE_VERSION='2'     # change it when the compiled form changes, so that old cache files are not used
+
+
+# the chemical species and reactions are the objects of the Direct Method OOP script
+_oop=loadscript('1.1. Gibson Direct Method_OOP.py')
+ChemicalSpecies=_oop.ChemicalSpecies
+Reaction=_oop.Reaction
+
+
+
+_name=r'[A-Za-z_][A-Za-z_0-9]*'
+_term=re.compile(r'^(?:(\d+)\s*\*?\s*)?('+_name+r')$')        # "A", "2 A" or "2*A"
+
+
+def parseside(side, line_no):
+    '''Parse one side of a reaction equation ("A + 2 B") into a list of (species, coefficient)'''
+
+    side=side.strip()
+    if side in ('','0','∅'):                                   # no reactant or no product
+        return []
+    term_list=[]
+    for term in side.split('+'):
+        match=_term.match(term.strip())
+        if match is None:
+            raise ValueError("line {0}: cannot read '{1}'".format(line_no,term.strip()))
+        term_list.append((match.group(2),int(match.group(1) or 1)))
+    return term_list
+
+
+def parsetext(text):
+    '''Parse a reaction network in the text format
+
+    One statement per line, "#" starts a comment:
+        A + B -> C, k1        reaction with the reaction constant k1 (a parameter name or a number)
+        2 A -> B, 0.5         coefficients are written before the species
+        0 -> A, k0            "0" (or nothing) for no reactant or no product
+        k1 = 1.0              value of a parameter
+        A = 6                 initial molecular number of a species (0 if not given)
+
+    Returns
+    -------
+    out: list with 3 elements
+       species: list of the species names, in order of first appearance
+       value_dic: dict of the values given with "name = value"
+       reaction_list: list of (reactant terms, product terms, constant name or number)
+    '''
+
+    species=[]
+    seen=set()
+    value_dic={}
+    reaction_list=[]
+    for line_no,line in enumerate(text.splitlines(),1):
+        line=line.split('#')[0].strip()
+        if not line:
+            continue
+        if '->' in line:
+            equation,comma,constant=line.rpartition(',')
+            if not comma:
+                raise ValueError("line {0}: the reaction constant is missing".format(line_no))
+            left,right=equation.split('->',1)
+            reactant=parseside(left,line_no)
+            product=parseside(right,line_no)
+            for name,coefficient in reactant+product:
+                if name not in seen:
+                    seen.add(name)
+                    species.append(name)
+            constant=constant.strip()
+            try:
+                constant=float(constant)
+            except ValueError:
+                if re.match('^'+_name+'$',constant) is None:
+                    raise ValueError("line {0}: cannot read the reaction constant '{1}'".format(line_no,constant))
+            reaction_list.append((reactant,product,constant))
+        elif '=' in line:
+            name,value=[i.strip() for i in line.split('=',1)]
+            if re.match('^'+_name+'$',name) is None:
+                raise ValueError("line {0}: cannot read the name '{1}'".format(line_no,name))
+            try:
+                value_dic[name]=float(value)
+            except ValueError:
+                raise ValueError("line {0}: cannot read the value '{1}' of {2}".format(line_no,value,name))
+        else:
+            raise ValueError("line {0}: cannot read '{1}'".format(line_no,line))
+    return species, value_dic, reaction_list
+
+
+def _tag(element):
+    return element.tag.rsplit('}',1)[-1]       # tag without the SBML namespace
+
+
+def _children(element, path):
+    '''give the elements found by following the tags of path, whatever the namespace'''
+    found=[element]
+    for tag in path.split('/'):
+        found=[c for e in found for c in e if _tag(c)==tag]
+    return found
+
+
+def parsesbml(text):
+    '''Parse the subset of SBML used for mass-action networks
+
+    Species (initialAmount, or initialConcentration), global parameters, and reactions with
+    stoichiometric reactants and products are read. The reaction constant is the (first) local
+    parameter of the kinetic law, or else the first global parameter used in its math. Kinetic
+    laws are assumed to be mass action; reversible reactions are read in the forward direction.
+
+    Returns
+    -------
+    out: the same as parsetext()
+    '''
+
+    root=ET.fromstring(text)
+    model=[e for e in root.iter() if _tag(e)=='model'][0]
+
+    species=[]
+    value_dic={}
+    for s in _children(model,'listOfSpecies/species'):
+        species.append(s.get('id'))
+        value_dic[s.get('id')]=float(s.get('initialAmount',s.get('initialConcentration',0)))
+    parameter_list=[]
+    for p in _children(model,'listOfParameters/parameter'):
+        parameter_list.append(p.get('id'))
+        value_dic[p.get('id')]=float(p.get('value',0))
+
+    reaction_list=[]
+    for r in _children(model,'listOfReactions/reaction'):
+        reactant=[(s.get('species'),int(float(s.get('stoichiometry',1))))
+                  for s in _children(r,'listOfReactants/speciesReference')]
+        product=[(s.get('species'),int(float(s.get('stoichiometry',1))))
+                 for s in _children(r,'listOfProducts/speciesReference')]
+
+        local=(_children(r,'kineticLaw/listOfLocalParameters/localParameter')+
+               _children(r,'kineticLaw/listOfParameters/parameter'))
+        if local:
+            constant=float(local[0].get('value'))
+        else:
+            used=[e.text.strip() for k in _children(r,'kineticLaw') for e in k.iter() if _tag(e)=='ci']
+            used=[i for i in used if i in parameter_list]
+            if not used:
+                raise ValueError("reaction {0}: no reaction constant in the kinetic law".format(r.get('id')))
+            constant=used[0]
+        reaction_list.append((reactant,product,constant))
+    return species, value_dic, reaction_list
+
+
+def compilemodel(species, value_dic, reaction_list):
+    '''Compile a parsed network into the arrays used by the simulation engines
+
+    Returns
+    -------
+    out: dict
+       'species': list of the species names
+       'initial': np.array, initial molecular number of each species
+       'reactant': np.array with shape (number of reactions, number of species), power of each
+                   species in the propensity of each reaction (reactant_matrix)
+       'change': np.array with the same shape, change of each species when each reaction occurs (change_matrix)
+       'reconstant': np.array, reaction constant of each reaction
+    '''
+
+    index_dic={name:i for i,name in enumerate(species)}
+    reactant_matrix=np.zeros((len(reaction_list),len(species)),dtype=np.int64)
+    change_matrix=np.zeros((len(reaction_list),len(species)),dtype=np.int64)
+    reconstant_list=np.empty(len(reaction_list))
+    for r,(reactant,product,constant) in enumerate(reaction_list):
+        for name,coefficient in reactant:
+            reactant_matrix[r,index_dic[name]]+=coefficient
+            change_matrix[r,index_dic[name]]-=coefficient
+        for name,coefficient in product:
+            change_matrix[r,index_dic[name]]+=coefficient
+        if isinstance(constant,str):
+            if constant not in value_dic:
+                raise ValueError("reaction {0}: the value of '{1}' is not given".format(r+1,constant))
+            constant=value_dic[constant]
+        reconstant_list[r]=constant
+
+    initial=np.array([int(value_dic.get(name,0)) for name in species],dtype=np.int64)
+    return {'species':list(species),'initial':initial,'reactant':reactant_matrix,
+            'change':change_matrix,'reconstant':reconstant_list}
+
+
+def loadmodel(path, cache_dir=None, use_cache=True):
+    '''Load a reaction network from a text file (or an SBML file: .xml or .sbml)
+
+    The compiled model is cached in cache_dir (by default __gibsoncache__ next to the model file),
+    keyed by the hash of the file contents, so loading the same file again skips the parsing.
+    The cache holds only arrays (np.savez, read without pickle), so a file put in the cache directory
+    cannot run code.
+    If the cache cannot be written (read-only directory, full disk) the model is returned uncached.
+
+    Returns
+    -------
+    out: dict
+       the compiled model, see compilemodel()
+    '''
+
+    with open(path,'rb') as f:
+        data=f.read()
+    key=hashlib.sha256(CACHE_VERSION.encode()+b'\0'+data).hexdigest()
+    if cache_dir is None:
+        cache_dir=os.path.join(os.path.dirname(os.path.abspath(path)),'__gibsoncache__')
+    cache_path=os.path.join(cache_dir,key+'.npz')
+
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with np.load(cache_path,allow_pickle=False) as cache:
+                model={name:cache[name] for name in ('initial','reactant','change','reconstant')}
+                model['species']=[str(i) for i in cache['species']]
+            return model
+        except (OSError,ValueError,KeyError,EOFError,zipfile.BadZipFile):
+            pass                                  # a broken cache file is parsed again and replaced
+
+    text=data.decode('utf-8')
+    if os.path.splitext(path)[1].lower() in ('.xml','.sbml'):
+        model=compilemodel(*parsesbml(text))
+    else:
+        model=compilemodel(*parsetext(text))
+
+    if use_cache:
+        temp_path=cache_path+'.{0}.tmp'.format(os.getpid())
+        try:
+            os.makedirs(cache_dir,exist_ok=True)
+            with open(temp_path,'wb') as f:       # write then rename, so that a parallel job never reads half a file
+                np.savez(f,species=np.array(model['species'],dtype=str),initial=model['initial'],
+                         reactant=model['reactant'],change=model['change'],reconstant=model['reconstant'])
+            os.replace(temp_path,cache_path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+    return model
+
+
+def buildsystem(model):
+    '''Build the ChemicalSpecies and Reaction objects of a compiled model (for the System classes)
+
+    Returns
+    -------
+    out: tuple with 2 elements
+       first element: list of ChemicalSpecies
+       second element: list of Reaction
+    '''
+
+    chemical_list=[ChemicalSpecies(name,int(count)) for name,count in zip(model['species'],model['initial'])]
+    reaction_list=[]
+    for r in range(len(model['reconstant'])):
+        reactant=np.flatnonzero(model['reactant'][r])
+        product=np.flatnonzero(model['change'][r]+model['reactant'][r])   # species present after the reaction
+        coefficient_dic={}
+        for i in reactant:
+            coefficient_dic[model['species'][i]]=int(model['reactant'][r,i])
+        for i in product:
+            name=model['species'][i]
+            coefficient=int(model['change'][r,i]+model['reactant'][r,i])
+            if coefficient_dic.get(name,coefficient)!=coefficient:
+                raise ValueError("reaction {0}: {1} has different coefficients as reactant and product, "
+                                 "which Reaction cannot represent".format(r+1,name))
+            coefficient_dic[name]=coefficient
+        reaction_list.append(Reaction([chemical_list[i] for i in reactant],[chemical_list[i] for i in product],
+                                      coefficient_dic,float(model['reconstant'][r])))
+    return chemical_list, reaction_list
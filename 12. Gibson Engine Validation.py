@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+Statistical validation of simulation engines against each other on reference models
+Python 3
+
+"""
+
+
+
+import time
+import numpy as np
+from scipy import stats
+from gibson import fixed_list, gibsonmodel, loadscript
+
+
+# An engine is a function engine(initialspecies_list, reconstant_list, reactant_matrix, change_matrix, t2, m, n, seed)
+# which simulates n trajectories from time 0 to t2 and returns an np.array with shape (n, m, number of species):
+# the state of each trajectory at the m evenly spaced time points np.linspace(0,t2,m) (the state just before
+# each time point, as in repeat()). An engine that cannot simulate a model (the first scripts only simulate
+# the 5 reactions of Gibson et al) raises UnsupportedModel.
+
+
+
+class UnsupportedModel(Exception):
+    '''define the error raised by an engine that cannot simulate a model'''
+
+
+
+def referencemodel():
+    '''Give the reference models used to validate the engines
+
+    Returns
+    -------
+    out: list
+       list of dict with the keys 'name', 'initial', 'reconstant', 'reactant', 'change' and 't2'
+    '''
+
+    model_list=[]
+
+    reactant_matrix, change_matrix=gibsonmodel()            # the 5 reactions of Gibson et al from fixed_list
+    model_list.append({'name':'gibson','initial':list(fixed_list),'reconstant':[1,1,1,1,1],
+                       'reactant':reactant_matrix,'change':change_matrix,'t2':0.1})
+
+    model_list.append({'name':'birth-death','initial':[0],'reconstant':[10,1],     # 0->A, A->0
+                       'reactant':np.array([[0],[1]]),'change':np.array([[1],[-1]]),'t2':3.0})
+
+    model_list.append({'name':'isomerization','initial':[30,0],'reconstant':[1,0.5],   # A->B, B->A
+                       'reactant':np.array([[1,0],[0,1]]),'change':np.array([[-1,1],[1,-1]]),'t2':2.0})
+
+    model_list.append({'name':'dimerization','initial':[40,0],'reconstant':[0.01,0.5],  # 2A->B, B->2A
+                       'reactant':np.array([[2,0],[0,1]]),'change':np.array([[-2,1],[2,-1]]),'t2':2.0})
+    return model_list
+
+
+def directengine(initialspecies_list,reconstant_list,reactant_matrix,change_matrix,t2,m,n,seed):
+    '''Direct Method for any model, one trajectory after another (directmethod() itself only simulates
+    the 5 reactions of Gibson et al, see stimulationengine())'''
+
+    rng=np.random.default_rng(seed)
+    reconstant_list=np.asarray(reconstant_list,dtype=float)
+    t_grid=np.linspace(0,t2,m)
+    state_grid=np.empty((n,m,len(initialspecies_list)),dtype=np.int64)
+    for k in range(n):
+        species=np.array(initialspecies_list,dtype=np.int64)
+        t=0.0
+        g=0
+        while True:
+            prop=reconstant_list*np.prod(species**reactant_matrix,axis=1)
+            sumprop=prop.sum()
+            tau=rng.exponential(1/sumprop) if sumprop>0 else np.inf
+            while g<m and t_grid[g]<t+tau:
+                state_grid[k,g]=species
+                g+=1
+            if t+tau>t2:
+                break
+            t+=tau
+            species+=change_matrix[rng.choice(len(prop),p=prop/sumprop)]
+        state_grid[k,g:]=species
+    return state_grid
+
+
+def checkgibson(initialspecies_list, reactant_matrix, change_matrix, name, initial=False):
+    '''Raise UnsupportedModel if the model is not the 5 reactions of Gibson et al (started from fixed_list if initial)'''
+
+    gibson_reactant, gibson_change=gibsonmodel()
+    if (np.shape(reactant_matrix)!=gibson_reactant.shape or (np.asarray(reactant_matrix)!=gibson_reactant).any()
+            or (np.asarray(change_matrix)!=gibson_change).any()):
+        raise UnsupportedModel("{0} only simulates the 5 reactions of Gibson et al".format(name))
+    if initial and list(initialspecies_list)!=fixed_list:
+        raise UnsupportedModel("{0} only starts from fixed_list".format(name))
+
+
+def gridstate(initialspecies_list, time_list, state_list, t_grid):
+    '''Give the state just before each time point of t_grid from the time of each reaction step and
+    the state after it (as recorded by the scripts simulating one trajectory)'''
+
+    state_list=np.concatenate([[initialspecies_list],np.reshape(state_list,(-1,len(initialspecies_list)))])
+    return state_list[np.searchsorted(np.asarray(time_list,dtype=float),t_grid,side='left')]
+
+
+# Engines running the first scripts of this repository, which only simulate the 5 reactions of Gibson et al.
+# These scripts draw from the global numpy.random state, which is seeded once per engine call.
+
+
+def stimulationengine(initialspecies_list,reconstant_list,reactant_matrix,change_matrix,t2,m,n,seed):
+    '''Engine running stimulation() of 1. Gibson Direct Method Code.py'''
+
+    checkgibson(initialspecies_list,reactant_matrix,change_matrix,'stimulation()')
+    script=loadscript('1. Gibson Direct Method Code.py')
+    np.random.seed(seed)
+    t_grid=np.linspace(0,t2,m)
+    state_grid=[]
+    for k in range(n):
+        x=[list(initialspecies_list),list(reconstant_list)]
+        equilstate,equiltime,t1_list,chemical_list=script.stimulation(x,0,t2)
+        state_grid.append(gridstate(initialspecies_list,t1_list,chemical_list,t_grid))
+    return np.array(state_grid)
+
+
+def repeatengine(initialspecies_list,reconstant_list,reactant_matrix,change_matrix,t2,m,n,seed):
+    '''Engine running repeat() of 1. Gibson Direct Method Code.py
+
+    repeat() gives the state at the first m-1 of its m window points, so it is run up to t2*m/(m-1)
+    with m+1 window points, whose first m are the time points np.linspace(0,t2,m).'''
+
+    checkgibson(initialspecies_list,reactant_matrix,change_matrix,'repeat()',initial=True)
+    script=loadscript('1. Gibson Direct Method Code.py')
+    np.random.seed(seed)
+    x=[list(initialspecies_list),list(reconstant_list)]
+    return np.array(script.repeat(x,0,t2*m/(m-1),m+1,n))
+
+
+def firstreactionengine(initialspecies_list,reconstant_list,reactant_matrix,change_matrix,t2,m,n,seed):
+    '''Engine running firstreaction() of 2. Gibson First Reaction Method Code.py step by step'''
+
+    checkgibson(initialspecies_list,reactant_matrix,change_matrix,'firstreaction()')
+    script=loadscript('2. Gibson First Reaction Method Code.py')
+    np.random.seed(seed)
+    t_grid=np.linspace(0,t2,m)
+    state_grid=[]
+    for k in range(n):
+        species_list=list(initialspecies_list)
+        t=0.0
+        time_list=[]
+        chemical_list=[]
+        while t<=t2:
+            if not np.any(reconstant_list*np.prod(np.asarray(species_list)**reactant_matrix,axis=1)):
+                break                                  # equilibrium, where firstreaction() cannot be called
+            species_list,tau,prop_list=script.firstreaction(*species_list,*reconstant_list)
+            t+=tau
+            time_list.append(t)
+            chemical_list.append(species_list)
+        state_grid.append(gridstate(initialspecies_list,time_list,chemical_list,t_grid))
+    return np.array(state_grid)
+
+
+def systemengine(scriptname, stimulate):
+    '''Make an engine running System.simulate() (stimulate=False) or System.stimulate() (stimulate=True)
+    of an OOP script, with the ChemicalSpecies and Reaction classes of that script'''
+
+    def engine(initialspecies_list,reconstant_list,reactant_matrix,change_matrix,t2,m,n,seed):
+        checkgibson(initialspecies_list,reactant_matrix,change_matrix,'System of '+scriptname)
+        script=loadscript(scriptname)
+        np.random.seed(seed)
+        t_grid=np.linspace(0,t2,m)
+        state_grid=[]
+        for k in range(n):
+            chemical_list=[script.ChemicalSpecies(name,int(count)) for name,count in zip('ABCDEFG',initialspecies_list)]
+            a,b,c,d,e,f,g=chemical_list
+            reaction_list=[script.Reaction([a,b],[c],{'A':1,'B':1,'C':1},reconstant_list[0]),     # A+B->C
+                           script.Reaction([b,c],[d],{'B':1,'C':1,'D':1},reconstant_list[1]),     # B+C->D
+                           script.Reaction([d,e],[e,f],{'D':1,'E':1,'F':1},reconstant_list[2]),   # D+E->E+F
+                           script.Reaction([f],[d,g],{'F':1,'D':1,'G':1},reconstant_list[3]),     # F->D+G
+                           script.Reaction([e,g],[a],{'E':1,'G':1,'A':1},reconstant_list[4])]     # E+G->A
+            if stimulate:
+                t_list,totalcount_list,equilibrium=script.System(reaction_list,chemical_list).stimulate(0,t2)
+                t_list,totalcount_list=t_list[1:],totalcount_list[1:]     # the first element is the initial state
+            else:
+                t_list,totalcount_list,equilibrium=script.System(reaction_list).simulate(t2)
+            state_grid.append(gridstate(initialspecies_list,t_list,totalcount_list,t_grid))
+        return np.array(state_grid)
+    return engine
+
+
+simulateengine=systemengine('1.1. Gibson Direct Method_OOP.py',False)         # System.simulate() of the Direct Method
+stimulateengine=systemengine('2.1. Gibson First Reaction Method_OOP.py',True)  # System.stimulate() of the First Reaction Method
+
+
+def trajectoryengine(function):
+    '''Make an engine from a function simulating one trajectory with the signature of nextreaction():
+    function(initialspecies_list, reconstant_list, t2, t_grid, seed, reactant_matrix, change_matrix)'''
+
+    def engine(initialspecies_list,reconstant_list,reactant_matrix,change_matrix,t2,m,n,seed):
+        t_grid=np.linspace(0,t2,m)
+        return np.array([function(initialspecies_list,reconstant_list,t2,t_grid,seed+i,reactant_matrix,change_matrix)
+                         for i in range(n)])
+    return engine
+
+
+def ensembleengine(function):
+    '''Make an engine from a function simulating a batch with the signature of firstreactionensemble():
+    function(initialspecies_list, reconstant_list, t2, m, n, seed, reactant_matrix, change_matrix) -> (t_grid, states)'''
+
+    def engine(initialspecies_list,reconstant_list,reactant_matrix,change_matrix,t2,m,n,seed):
+        return function(initialspecies_list,reconstant_list,t2,m,n,seed,reactant_matrix,change_matrix)[1]
+    return engine
+
+
+def chisquare(x, y, minexpected=5):
+    '''Chi-square test that two samples of counts come from the same distribution
+
+    Neighbouring count values are pooled until every bin expects at least minexpected samples.
+    Returns the p-value (1.0 when there is only one bin).'''
+
+    value=np.arange(min(x.min(),y.min()),max(x.max(),y.max())+1)
+    table=np.array([np.bincount(x-value[0],minlength=len(value)),np.bincount(y-value[0],minlength=len(value))])
+
+    pooled=[]
+    current=np.zeros(2)
+    for column in table.T:               # pool the bins from the left until they are large enough
+        current=current+column
+        if current.sum()*min(len(x),len(y))/(len(x)+len(y))>=minexpected:
+            pooled.append(current)
+            current=np.zeros(2)
+    if current.sum()>0:
+        if pooled:
+            pooled[-1]=pooled[-1]+current
+        else:
+            pooled.append(current)
+    if len(pooled)<2:
+        return 1.0
+    return stats.chi2_contingency(np.array(pooled).T)[1]
+
+
+def momenttest(x, y):
+    '''z-tests that two samples have the same mean and the same variance; returns the two p-values'''
+
+    x=x.astype(float)
+    y=y.astype(float)
+    se=np.sqrt(x.var(ddof=1)/len(x)+y.var(ddof=1)/len(y))
+    pmean=1.0 if se==0 else 2*stats.norm.sf(abs(x.mean()-y.mean())/se)
+
+    def varerror(z):                     # standard error of the sample variance
+        return (np.mean((z-z.mean())**4)-z.var()**2)/len(z)
+    se=np.sqrt(varerror(x)+varerror(y))
+    pvar=1.0 if se==0 else 2*stats.norm.sf(abs(x.var(ddof=1)-y.var(ddof=1))/se)
+    return pmean, pvar
+
+
+def compare(engine1, engine2, model_list=None, m=5, n=2000, seed=0, alpha=0.001):
+    '''Run two engines on the reference models and test that they sample the same distribution
+
+    For every model, every time point after 0 and every species that is not constant, the two
+    marginal distributions are compared with the two-sample KS test, a chi-square test and the
+    z-tests on the mean and the variance. A model passes when no p-value is below alpha after
+    the Bonferroni correction for the number of tests. The engines use different seeds, so the
+    samples are independent.
+
+    parameters
+    ----------
+    engine1, engine2: function
+      the engines to compare (see the top of this file)
+    model_list: list
+      reference models, referencemodel() if not given
+    m: int
+      number of time points
+    n: int
+      number of trajectories per engine and model
+    seed: int
+      seed of engine1 (engine2 uses seed+n)
+    alpha: float
+      family-wise significance level of each model
+
+    Returns
+    -------
+    out: list
+       one dict per model with 'name', 'passed' (None if an engine cannot simulate the model),
+       'ntest', 'minp' (smallest p-value), 'failed' (list of (test, time point, species, p-value)
+       below the corrected level), 'time1', 'time2' (seconds) and 'ratio' (time1/time2)
+    '''
+
+    if model_list is None:
+        model_list=referencemodel()
+    report_list=[]
+    for model in model_list:
+        args=(model['initial'],np.asarray(model['reconstant'],dtype=float),np.asarray(model['reactant']),
+              np.asarray(model['change']),model['t2'],m)
+        try:
+            start=time.perf_counter()
+            x=np.asarray(engine1(*args,n,seed))
+            time1=time.perf_counter()-start
+            start=time.perf_counter()
+            y=np.asarray(engine2(*args,n,seed+n))
+            time2=time.perf_counter()-start
+        except UnsupportedModel:             # the model is skipped
+            report_list.append({'name':model['name'],'passed':None,'ntest':0,'minp':1.0,'failed':[],
+                                'time1':np.nan,'time2':np.nan,'ratio':np.nan})
+            continue
+
+        result_list=[]
+        for g in range(1,m):
+            for s in range(x.shape[2]):
+                a=x[:,g,s]
+                b=y[:,g,s]
+                if a.min()==a.max()==b.min()==b.max():      # the same constant in both: nothing to test
+                    continue
+                pmean,pvar=momenttest(a,b)
+                result_list+=[('ks',g,s,stats.ks_2samp(a,b).pvalue),('chi2',g,s,chisquare(a,b)),
+                              ('mean',g,s,pmean),('variance',g,s,pvar)]
+
+        ntest=max(len(result_list),1)
+        failed=[i for i in result_list if i[3]<alpha/ntest]
+        report_list.append({'name':model['name'],'passed':not failed,'ntest':len(result_list),
+                            'minp':min([i[3] for i in result_list],default=1.0),'failed':failed,
+                            'time1':time1,'time2':time2,'ratio':time1/time2 if time2>0 else np.inf})
+    return report_list
+
+
+def printreport(report_list):
+    '''Print the result of compare() as a table'''
+
+    print("{0:<16}{1:<8}{2:>7}{3:>12}{4:>10}{5:>10}{6:>8}".format('model','result','tests','min p','time1','time2','ratio'))
+    for r in report_list:
+        print("{0:<16}{1:<8}{2:>7}{3:>12.3g}{4:>10.3f}{5:>10.3f}{6:>8.2f}".format(
+            r['name'],{True:'pass',False:'FAIL',None:'skip'}[r['passed']],r['ntest'],r['minp'],r['time1'],r['time2'],r['ratio']))
+        for test,g,s,p in r['failed']:
+            print("    {0} test failed at time point {1}, species {2}: p={3:.3g}".format(test,g,s,p))
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Local asyncio job server streaming the results of simulations of the Gibson et al system
+Python 3
+
+"""
+
+
+
+import os
+import json
+import asyncio
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from gibson import gibsonmodel, loadscript, ScriptFunction
+
+
+# the batches are run with the vectorized First Reaction Method
+firstreactionbatch=loadscript('9. Gibson Vectorized First Reaction Method.py').firstreactionbatch
+
+
+def simulatebatch(initial,reconstant_list,reactant_matrix,change_matrix,t_start,t_grid,t_end,seed):
+    '''Use the First Reaction Method to simulate a batch of trajectories from t_start to t_end
+
+    parameters
+    ----------
+    initial: np.array with shape (number of trajectories, number of species)
+      molecular number of the chemical species of each trajectory at t_start
+    reconstant_list, reactant_matrix, change_matrix: np.array
+      the model
+    t_start, t_end: float
+      starting and ending time
+    t_grid: np.array
+      time points (between t_start and t_end) at which the state is recorded
+    seed: int
+      seed of the random number generator
+
+    Returns
+    -------
+    out: tuple with 2 elements
+       first element: np.array with shape (number of trajectories, len(t_grid), number of species)
+            state of each trajectory just before each time point
+       second element: np.array with shape (number of trajectories, number of species)
+            state of each trajectory at t_end
+    '''
+
+    species=np.array(initial,dtype=np.int64)
+    state_grid=firstreactionbatch(species,reconstant_list,reactant_matrix,change_matrix,t_start,t_grid,t_end,
+                                  np.random.default_rng(seed))
+    return state_grid, species
+
+
+def ensemblebatch(initialspecies_list,reconstant_list,reactant_matrix,change_matrix,t2,m,n,seed):
+    '''Simulate n trajectories from time 0 to t2 and give the count, sum and sum of squares of their states at m time points'''
+
+    initial=np.tile(np.asarray(initialspecies_list,dtype=np.int64),(n,1))
+    state=simulatebatch(initial,reconstant_list,reactant_matrix,change_matrix,0.0,np.linspace(0,t2,m),t2,seed)[0]
+    state=state.astype(float)
+    return n, state.sum(axis=0), (state**2).sum(axis=0)
+
+
+
+class JobServer(object):
+    '''define the class of the simulation job server
+
+    Clients connect over TCP and exchange one JSON object per line. Requests:
+        {"op": "ensemble", "id": ..., "initial": [...], "reconstant": [...], "t2": ..., "m": ..., "n": ...,
+         "batchsize": ..., "seed": ..., "reactant": [[...]], "change": [[...]]}
+            run n trajectories in batches on the process pool; after each batch a message
+            {"type": "partial", "id", "done", "n", "t", "mean", "variance"} gives the running statistics
+        {"op": "trajectory", "id": ..., "initial", "reconstant", "t2", "m", "segments", "seed", "reactant", "change"}
+            run one trajectory in time segments; a message {"type": "state", "id", "t", "state"} is sent
+            for every time point as soon as its segment is done
+        {"op": "cancel", "id": ...}
+            cancel a running job; it answers {"type": "cancelled", "id"}
+    Every job ends with {"type": "done", "id"}, {"type": "cancelled", "id"} or {"type": "error", "id", "message"}.
+    "reactant" and "change" may be left out for the 5 reactions of Gibson et al.
+
+    Messages go through a bounded queue per connection: when a client reads slowly the queue
+    fills up and its jobs stop submitting new batches until it catches up (backpressure).
+    The batch functions are sent to the process pool as ScriptFunction, so the pool can use any start method.'''
+
+    def __init__(self, host='127.0.0.1', port=8765, processes=None, queuesize=64, inflight=None):
+        self.host=host
+        self.port=port
+        self.queuesize=queuesize
+        self.executor=ProcessPoolExecutor(processes)
+        self.inflight=inflight or processes or os.cpu_count()   # batches submitted at once per job
+        self.server=None
+        self.connection_dic={}          # handler task of each open connection: its writer
+
+
+    async def start(self):
+        '''start listening; returns the asyncio server (its sockets give the actual port)'''
+        # start the worker processes before any connection is accepted: forked later they would
+        # inherit the client sockets and keep them open after the server closes them
+        await asyncio.get_running_loop().run_in_executor(self.executor,os.getpid)
+        self.server=await asyncio.start_server(self.handle,self.host,self.port)
+        return self.server
+
+
+    async def close(self):
+        '''stop listening, close the open connections (their jobs are cancelled) and shut the process pool down'''
+        if self.server is not None:
+            self.server.close()
+        for writer in list(self.connection_dic.values()):
+            writer.close()
+        await asyncio.gather(*self.connection_dic,return_exceptions=True)
+        if self.server is not None:
+            await self.server.wait_closed()
+        self.executor.shutdown(cancel_futures=True)
+
+
+    async def handle(self, reader, writer):
+        '''serve one client connection'''
+        outbox=asyncio.Queue(self.queuesize)
+        job_dic={}
+        self.connection_dic[asyncio.current_task()]=writer
+
+        async def send():
+            try:
+                while True:
+                    message=await outbox.get()
+                    writer.write((json.dumps(message)+'\n').encode())
+                    await writer.drain()     # wait while the client is not reading
+            except ConnectionError:
+                pass
+
+        def ended(task, jid):
+            '''forget a finished job; a job cancelled before it started has not sent its final message yet'''
+            job_dic.pop(jid,None)
+            if task.cancelled():
+                job_dic[jid]=asyncio.ensure_future(outbox.put({'type':'cancelled','id':jid}))
+                job_dic[jid].add_done_callback(lambda task: job_dic.pop(jid,None))
+
+        sender=asyncio.create_task(send())
+        try:
+            while True:
+                try:
+                    line=await reader.readline()
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                try:
+                    request=json.loads(line)
+                except ValueError:
+                    await outbox.put({'type':'error','id':None,'message':'cannot read the request'})
+                    continue
+                if not isinstance(request,dict):
+                    await outbox.put({'type':'error','id':None,'message':'the request is not a JSON object'})
+                    continue
+                op=request.get('op')
+                jid=request.get('id')
+                if isinstance(jid,(list,dict)):
+                    await outbox.put({'type':'error','id':None,'message':'the id must be a number or a string'})
+                    continue
+                if op=='cancel':
+                    if jid in job_dic:
+                        job_dic[jid].cancel()
+                    continue
+                if op not in ('ensemble','trajectory'):
+                    await outbox.put({'type':'error','id':jid,'message':"unknown op '{0}'".format(op)})
+                    continue
+                if jid in job_dic:
+                    await outbox.put({'type':'error','id':jid,'message':'a job with this id is running'})
+                    continue
+                job_dic[jid]=asyncio.create_task(self.runjob(op,request,outbox))
+                job_dic[jid].add_done_callback(lambda task,jid=jid: ended(task,jid))
+        finally:
+            sender.cancel()
+            for task in list(job_dic.values()):   # the client has gone: cancel its jobs
+                task.cancel()
+            while job_dic:                        # nobody reads any more: discard the messages so the jobs can end
+                while not outbox.empty():
+                    outbox.get_nowait()
+                await asyncio.sleep(0.01)
+            writer.close()
+            self.connection_dic.pop(asyncio.current_task(),None)
+
+
+    async def runjob(self, op, request, outbox):
+        '''run one job and put its messages into outbox'''
+        jid=request.get('id')
+        try:
+            if op=='ensemble':
+                await self.ensemble(request,outbox)
+            else:
+                await self.trajectory(request,outbox)
+            await outbox.put({'type':'done','id':jid})
+        except asyncio.CancelledError:
+            await outbox.put({'type':'cancelled','id':jid})
+        except Exception as error:
+            await outbox.put({'type':'error','id':jid,'message':str(error)})
+
+
+    def require(self, request, field_list):
+        '''raise ValueError with a readable message if a field of field_list is missing from a request'''
+        for field in field_list:
+            if field not in request:
+                raise ValueError("missing field '{0}'".format(field))
+
+
+    def model(self, request):
+        '''read the model of a request'''
+        self.require(request,['initial','reconstant','t2'])
+        initial=np.array(request['initial'],dtype=np.int64)
+        reconstant_list=np.array(request['reconstant'],dtype=float)
+        if 'reactant' in request or 'change' in request:
+            self.require(request,['reactant','change'])
+            reactant_matrix=np.array(request['reactant'],dtype=np.int64)
+            change_matrix=np.array(request['change'],dtype=np.int64)
+        else:
+            reactant_matrix,change_matrix=gibsonmodel()
+        shape=(len(reconstant_list),len(initial))
+        if initial.ndim!=1 or reconstant_list.ndim!=1 or reactant_matrix.shape!=shape or change_matrix.shape!=shape:
+            raise ValueError("'reactant' and 'change' need one row per reaction constant and one column per species "
+                             "(the 5 reactions and 7 species of Gibson et al when they are left out)")
+        return initial, reconstant_list, reactant_matrix, change_matrix
+
+
+    async def ensemble(self, request, outbox):
+        '''run the batches of an ensemble job and stream the running mean and variance'''
+        loop=asyncio.get_running_loop()
+        self.require(request,['n'])
+        initial,reconstant_list,reactant_matrix,change_matrix=self.model(request)
+        t2=float(request['t2'])
+        m=int(request.get('m',11))
+        n=int(request['n'])
+        batchsize=int(request.get('batchsize',100))
+        seed=int(request.get('seed',0))
+        t_grid=np.linspace(0,t2,m).tolist()
+
+        batch_list=[(min(batchsize,n-first),seed+first) for first in range(0,n,batchsize)]
+        pending=set()
+        count=0
+        total=np.zeros((m,len(initial)))
+        totalsq=np.zeros((m,len(initial)))
+        try:
+            while batch_list or pending:
+                while batch_list and len(pending)<self.inflight:
+                    size,batchseed=batch_list.pop(0)
+                    pending.add(loop.run_in_executor(self.executor,ScriptFunction(__file__,'ensemblebatch'),
+                                                     initial,reconstant_list,reactant_matrix,change_matrix,
+                                                     t2,m,size,batchseed))
+                finished,pending=await asyncio.wait(pending,return_when=asyncio.FIRST_COMPLETED)
+                for future in finished:
+                    c,s,sq=future.result()
+                    count+=c
+                    total+=s
+                    totalsq+=sq
+                mean=total/count
+                variance=(totalsq/count-mean**2)*count/max(count-1,1)
+                await outbox.put({'type':'partial','id':request.get('id'),'done':count,'n':n,'t':t_grid,
+                                  'mean':mean.tolist(),'variance':variance.tolist()})
+        finally:
+            for future in pending:          # cancelled: drop the batches not started yet
+                future.cancel()
+
+
+    async def trajectory(self, request, outbox):
+        '''run one trajectory segment by segment and stream its state at every time point'''
+        loop=asyncio.get_running_loop()
+        initial,reconstant_list,reactant_matrix,change_matrix=self.model(request)
+        t2=float(request['t2'])
+        m=int(request.get('m',101))
+        segments=int(request.get('segments',10))
+        seed=int(request.get('seed',0))
+        t_grid=np.linspace(0,t2,m)
+
+        species=initial[None,:]
+        bound=np.linspace(0,t2,segments+1)
+        for k in range(segments):           # the process is Markov: each segment starts from the end of the previous one
+            if k<segments-1:
+                inside=(t_grid>=bound[k])&(t_grid<bound[k+1])
+            else:
+                inside=t_grid>=bound[k]
+            state,species=await loop.run_in_executor(self.executor,ScriptFunction(__file__,'simulatebatch'),
+                                                     species,reconstant_list,reactant_matrix,change_matrix,
+                                                     bound[k],t_grid[inside],bound[k+1],seed+k)
+            for t,s in zip(t_grid[inside],state[0]):
+                await outbox.put({'type':'state','id':request.get('id'),'t':float(t),'state':s.tolist()})
+
+
+
+async def stream(host, port, request):
+    '''Send one request to the job server and yield its messages until the job ends (an async generator)'''
+
+    reader,writer=await asyncio.open_connection(host,port,limit=2**24)   # one message per line, lines can be long
+    try:
+        writer.write((json.dumps(request)+'\n').encode())
+        await writer.drain()
+        while True:
+            line=await reader.readline()
+            if not line:
+                break
+            message=json.loads(line)
+            yield message
+            if message['type'] in ('done','cancelled','error'):
+                break
+    finally:
+        writer.close()
+
+
+async def serve(host='127.0.0.1', port=8765, processes=None):
+    '''Run a job server until it is cancelled'''
+
+    server=JobServer(host,port,processes)
+    await server.start()
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
@@ -93,7 +93,7 @@ def reaction2(a, d, e=0):   #reaction 3: a+b->c+d
     '''
     if a>0:
         a, d, e = a-1, e, d+1
-    return a, e, d
+    return a, d, e
 
 
 def reaction3(e,f,g):   #reaction 4: E->F+G
@@ -80,7 +80,7 @@ class System(object):
                 tau_list.append(((1/i)*np.log(1/(1-np.random.random()))))
         
         
-        if prop_list!=[0,0,0,0,0]:  # if prop_list!=[0,0,0,0,0], the system did not reach equilibrium
+        if any(prop_list):          # if prop_list!=[0,0,0,0,0], the system did not reach equilibrium
             tau=min(tau_list)
             u=np.argmin(tau_list)
             
@@ -95,7 +95,7 @@ class System(object):
             else:
                 [l,n],[h]=rx5.execute()
             
-        elif prop_list==[0,0,0,0,0]: # if tau_list=[0,0,0,0,0], the system has reached equilibrium
+        elif not any(prop_list):     # if tau_list=[0,0,0,0,0], the system has reached equilibrium
             in_equilibrium = True
             tau=np.inf
         
@@ -108,8 +108,11 @@ class System(object):
 
         
         
-    def stimulate(self,start_time, end_time):
-        '''Stimulate the reactions during a given time period from start_time to end_time'''
+    def stimulate(self,start_time, end_time, stop=None):
+        '''Stimulate the reactions during a given time period from start_time to end_time
+        
+        stop(chemcount_list, t, nfired) is an optional stop condition called on the initial state and after each reaction
+        step; if it returns True the stimulation stops and the last elements of the results are the hitting time and state'''
         
         t0=start_time    # will be used to store the reaction time, and the initial vaule of it is the stimulation start time
         t_list=[start_time] # will be used to store t0, and the first element is the stimulation start time
@@ -126,6 +129,8 @@ class System(object):
         
         equilibrium=False
         
+        if stop is not None and stop(chemcount_list,t0,0):   # the initial state is already the hitting state
+            return np.array(t_list), np.array(totalcount_list), equilibrium
         
         species_list, t, equilibrium=self.run_firstreaction()  # since for the first round of run_firstreaction, the value of 
                                                                 # chemical species was from the self.chemical_list,(following 
@@ -143,6 +148,8 @@ class System(object):
             
         
         while t0<end_time:   # when t0<end_time (stimulation ending time), run the while loop
+            if stop is not None and stop(chemcount_list,t0,len(t_list)-1):  # the stop condition is reached after the
+                break                                                         # previous reaction step
             species_list, t, equilibrium=self.run_firstreaction(species_list) # use previous species_list as input to run the 
                                                                             # run_directmethod.
             if t!=np.inf:  # t!=np.inf means prob_list!=[0,0,0,0,0], the system has not reached equilibrium
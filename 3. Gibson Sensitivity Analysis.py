@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Finite-difference sensitivity of the Gibson et al system with common random numbers
+Python 3
+
+"""
+
+
+
+import numpy as np
+from gibson import gibsonmodel, propensityarray
+
+
+def nextreaction(initialspecies_list,reconstant_list,t2,t_grid,seed,reactant_matrix=None,change_matrix=None,stop=None):
+    '''Use the (modified) Next Reaction Method to simulate the system from time 0 to t2
+
+    Every reaction channel owns an independent random stream and an internal clock of a unit
+    rate Poisson process, so that two runs with the same seed but different reaction constants
+    share their random numbers channel by channel (common random numbers).
+
+    parameters
+    ----------
+    initialspecies_list: list
+      molecular number of all the chemical species at time 0
+    reconstant_list: list
+      reaction constants of the reactions
+    t2: float
+      ending time
+    t_grid: np.array
+      time points (between 0 and t2) at which the system state is recorded
+    seed: int
+      seed of the random streams of this trajectory
+    reactant_matrix, change_matrix: np.array
+      model matrices, the 5 reactions of Gibson et al are used if not given
+    stop: function (optional)
+      stop(species, t, nfired) is called on the initial state and after each reaction step; the simulation stops
+      when it returns True
+
+    Returns
+    -------
+    out: np.array with shape (len(t_grid), number of species)
+       molecular number of the chemical species at each time point in t_grid (once the stop
+       condition is reached the hitting state is held for the remaining time points)
+    '''
+
+    if reactant_matrix is None:
+        reactant_matrix, change_matrix=gibsonmodel()
+    reconstant_list=np.asarray(reconstant_list,dtype=float)
+    nreaction=len(reconstant_list)
+
+    streams=[np.random.RandomState(s) for s in np.random.SeedSequence(seed).generate_state(nreaction)]
+    species=np.array(initialspecies_list,dtype=np.int64)
+    state_grid=np.empty((len(t_grid),len(species)),dtype=np.int64)
+
+    internal=np.zeros(nreaction)      # internal time of each unit rate Poisson process
+    nextfire=np.array([s.exponential() for s in streams])    # internal time of the next firing of each channel
+
+    t=0.0
+    nfired=0
+    g=0                                # index of the next time point in t_grid to be recorded
+    if stop is not None and stop(species,t,nfired):    # the initial state is already the hitting state
+        state_grid[:]=species
+        return state_grid
+
+    while True:
+        prop=propensityarray(species,reconstant_list,reactant_matrix)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            dt_list=np.where(prop>0,(nextfire-internal)/prop,np.inf)
+        u=np.argmin(dt_list)
+        tau=dt_list[u]
+
+        while g<len(t_grid) and t_grid[g]<t+tau and t_grid[g]<=t2:   # record the state before the reaction occurs
+            state_grid[g]=species
+            g+=1
+        if tau==np.inf or t+tau>t2:     # no reaction can occur any more, or the next reaction occurs after t2
+            break
+
+        t+=tau
+        internal+=prop*tau
+        species+=change_matrix[u]
+        nextfire[u]+=streams[u].exponential()
+        nfired+=1
+        if stop is not None and stop(species,t,nfired):
+            break
+
+    state_grid[g:]=species            # hold the last state for the remaining time points
+    return state_grid
+
+
+def sensitivity(initialspecies_list,reconstant_list,t2,m,n,h=0.05,seed=0,relative=True):
+    '''Estimate the derivative of the mean molecular number with respect to each reaction constant
+
+    The perturbed and unperturbed trajectories of each replicate use the same seed, so that
+    the forward difference of the coupled pair has a much smaller variance than the difference
+    of two independent ensembles.
+
+    parameters
+    ----------
+    initialspecies_list: list
+      molecular number of all the 7 chemicals (A~G) at time 0
+    reconstant_list: list
+      reaction constants of the 5 chemical reactions
+    t2: float
+      ending time
+    m: int
+      number of evenly spaced time points from 0 to t2 at which the sensitivity is estimated
+    n: int
+      number of replicates (pairs of coupled trajectories)
+    h: float
+      perturbation of the reaction constants
+    seed: int
+      seed of the first replicate; replicate i uses seed+i
+    relative: boolean
+      if True the perturbation is h*k, otherwise the perturbation is h
+
+    Returns
+    -------
+    out: tuple with 3 elements
+       first element: np.array with shape (m,)
+            the time points
+       second element: np.array with shape (number of reactions, m, number of species)
+            estimate of d(mean molecular number)/dk for each reaction constant k
+       third element: np.array with the same shape as the second element
+            variance of each estimate (sample variance of the differences divided by n)
+    '''
+
+    reconstant_list=np.asarray(reconstant_list,dtype=float)
+    t_grid=np.linspace(0,t2,m)
+    nominal=np.array([nextreaction(initialspecies_list,reconstant_list,t2,t_grid,seed+i) for i in range(n)])
+
+    derivative=np.empty((len(reconstant_list),m,len(initialspecies_list)))
+    variance=np.empty_like(derivative)
+    for j in range(len(reconstant_list)):
+        dk=h*reconstant_list[j] if relative else h
+        perturbed_list=reconstant_list.copy()
+        perturbed_list[j]+=dk
+        perturbed=np.array([nextreaction(initialspecies_list,perturbed_list,t2,t_grid,seed+i) for i in range(n)])
+
+        difference=(perturbed-nominal)/dk          # coupled forward difference of each replicate
+        derivative[j]=difference.mean(axis=0)
+        variance[j]=difference.var(axis=0,ddof=1)/n if n>1 else np.nan
+
+    return t_grid, derivative, variance
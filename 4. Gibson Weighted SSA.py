@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Weighted SSA (importance sampling) for rare-event probabilities of the Gibson et al system
+Python 3
+
+"""
+
+
+
+import numpy as np
+from gibson import gibsonmodel, propensityarray
+
+
+def weightedssa(initialspecies_list,reconstant_list,bias_list,index,threshold,t2,rng,
+                reactant_matrix,change_matrix,below=True):
+    '''Simulate one trajectory with the biased propensities and track its likelihood ratio weight
+
+    The propensity of reaction j is multiplied by bias_list[j]. The trajectory stops when
+    species number index reaches threshold or at time t2, whichever is first.
+
+    parameters
+    ----------
+    initialspecies_list: list
+      molecular number of all the chemical species at time 0
+    reconstant_list: np.array
+      reaction constants of the reactions
+    bias_list: np.array
+      biasing factor of each reaction
+    index: int
+      index of the species whose molecular number defines the rare event
+    threshold: int
+      the rare event is reached when the molecular number is <= threshold (>= threshold if below is False)
+    t2: float
+      ending time
+    rng: np.random.Generator
+      random number generator
+    reactant_matrix, change_matrix: np.array
+      model matrices
+    below: boolean
+      direction of the rare event
+
+    Returns
+    -------
+    out: list
+       one record each time the trajectory reaches a new extreme value of the molecular number
+       (a new minimum if below is True). Each record is a tuple (level, log weight, fired count
+       of each reaction, integral of the unbiased propensity of each reaction over time).
+    '''
+
+    sign=1 if below else -1          # compare sign*count, so that the event is always "level <= threshold"
+    species=np.array(initialspecies_list,dtype=np.int64)
+    nfired=np.zeros(len(reconstant_list))
+    integral=np.zeros(len(reconstant_list))
+    logweight=0.0
+    t=0.0
+
+    level=sign*species[index]
+    record_list=[(level,logweight,nfired.copy(),integral.copy())]
+    while level>sign*threshold:
+        prop=propensityarray(species,reconstant_list,reactant_matrix)
+        biasprop=bias_list*prop
+        sumprop=prop.sum()
+        sumbias=biasprop.sum()
+        if sumbias==0:                 # no reaction can occur any more
+            break
+
+        tau=rng.exponential(1/sumbias)
+        if t+tau>t2:                   # the next reaction occurs after t2, account for the time left and stop
+            logweight-=(sumprop-sumbias)*(t2-t)
+            integral+=prop*(t2-t)
+            break
+
+        u=rng.choice(len(prop),p=biasprop/sumbias)
+        t+=tau
+        logweight+=np.log(prop[u]/biasprop[u])-(sumprop-sumbias)*tau
+        integral+=prop*tau
+        nfired[u]+=1
+        species+=change_matrix[u]
+
+        if sign*species[index]<level:  # a new extreme value has been reached
+            level=sign*species[index]
+            record_list.append((level,logweight,nfired.copy(),integral.copy()))
+
+    return record_list
+
+
+def firstrecord(record_list,level):
+    '''Give the first record of a trajectory that reaches level, or None if the level is never reached'''
+
+    for i in record_list:
+        if i[0]<=level:
+            return i
+    return None
+
+
+def crossentropy(initialspecies_list,reconstant_list,index,threshold,t2,n=1000,rho=0.01,
+                 maxiter=20,seed=0,reactant_matrix=None,change_matrix=None,below=True):
+    '''Tune the biasing factors with the multilevel cross-entropy method
+
+    In each round n biased trajectories are simulated. The intermediate rare event is the
+    extreme value reached by the best rho fraction of them (or threshold itself once enough
+    trajectories reach it), and the biasing factors are updated to the cross-entropy optimum
+    for that intermediate event.
+
+    parameters
+    ----------
+    initialspecies_list: list
+      molecular number of all the chemical species at time 0
+    reconstant_list: list
+      reaction constants of the reactions
+    index, threshold, t2, below:
+      definition of the rare event, see weightedssa()
+    n: int
+      number of trajectories in each round
+    rho: float
+      fraction of trajectories defining the intermediate rare event
+    maxiter: int
+      maximal number of rounds
+    seed: int
+      seed of the random number generator
+    reactant_matrix, change_matrix: np.array
+      model matrices, the 5 reactions of Gibson et al are used if not given
+
+    Returns
+    -------
+    out: np.array
+       biasing factor of each reaction
+    '''
+
+    if reactant_matrix is None:
+        reactant_matrix, change_matrix=gibsonmodel()
+    reconstant_list=np.asarray(reconstant_list,dtype=float)
+    rng=np.random.default_rng(seed)
+    sign=1 if below else -1
+    target=sign*threshold
+
+    bias_list=np.ones(len(reconstant_list))
+    for iteration in range(maxiter):
+        path_list=[weightedssa(initialspecies_list,reconstant_list,bias_list,index,threshold,t2,rng,
+                               reactant_matrix,change_matrix,below) for i in range(n)]
+        extreme_list=np.array([p[-1][0] for p in path_list])
+        level=max(target,np.quantile(extreme_list,rho,method='higher'))  # intermediate rare event
+
+        numerator=np.zeros(len(reconstant_list))
+        denominator=np.zeros(len(reconstant_list))
+        for p in path_list:
+            r=firstrecord(p,level)
+            if r is not None:
+                w=np.exp(r[1])
+                numerator+=w*r[2]
+                denominator+=w*r[3]
+
+        update=denominator>0           # channels never used by the successful trajectories keep their bias
+        bias_list[update]=numerator[update]/denominator[update]
+        bias_list[bias_list==0]=1.0    # a zero bias would make the event unreachable for those channels
+        if level==target:
+            break
+
+    return bias_list
+
+
+def rareevent(initialspecies_list,reconstant_list,index,threshold,t2,n=10000,bias_list=None,
+              seed=0,reactant_matrix=None,change_matrix=None,below=True):
+    '''Estimate the probability that a species reaches threshold before time t2
+
+    parameters
+    ----------
+    initialspecies_list: list
+      molecular number of all the chemical species at time 0
+    reconstant_list: list
+      reaction constants of the reactions
+    index, threshold, t2, below:
+      definition of the rare event, see weightedssa()
+    n: int
+      number of trajectories
+    bias_list: list
+      biasing factor of each reaction; if None they are tuned with crossentropy() first
+    seed: int
+      seed of the random number generator
+    reactant_matrix, change_matrix: np.array
+      model matrices, the 5 reactions of Gibson et al are used if not given
+
+    Returns
+    -------
+    out: tuple with 3 elements
+       first element: float
+            unbiased estimate of the probability
+       second element: float
+            standard error of the estimate
+       third element: np.array
+            the biasing factors used
+    '''
+
+    if reactant_matrix is None:
+        reactant_matrix, change_matrix=gibsonmodel()
+    reconstant_list=np.asarray(reconstant_list,dtype=float)
+    if bias_list is None:
+        bias_list=crossentropy(initialspecies_list,reconstant_list,index,threshold,t2,seed=seed+1,
+                               reactant_matrix=reactant_matrix,change_matrix=change_matrix,below=below)
+    bias_list=np.asarray(bias_list,dtype=float)
+    rng=np.random.default_rng(seed)
+    sign=1 if below else -1
+
+    weight_list=np.zeros(n)
+    for i in range(n):
+        p=weightedssa(initialspecies_list,reconstant_list,bias_list,index,threshold,t2,rng,
+                      reactant_matrix,change_matrix,below)
+        if p[-1][0]<=sign*threshold:   # the trajectory has reached the rare event
+            weight_list[i]=np.exp(p[-1][1])
+
+    estimate=weight_list.mean()
+    error=weight_list.std(ddof=1)/np.sqrt(n) if n>1 else np.nan
+    return estimate, error, bias_list
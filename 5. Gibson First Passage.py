@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Stop conditions and first-passage times of the Gibson et al system
+Python 3
+
+"""
+
+
+
+import numpy as np
+from gibson import gibsonmodel
+
+
+# The stop conditions below can be passed as the stop argument of stimulation(), System.simulate(),
+# System.stimulate(), nextreaction(), windowstate() (and SharedEnsemble), firstreactionensemble() and
+# SpatialSystem.simulate() (with the total count of each species over the subvolumes). They are called as
+# stop(species, t, nfired) and accept
+# either one state (shape (number of species,)) or a batch of states (shape (number of trajectories,
+# number of species)), in which case t and nfired are arrays and a boolean array is returned.
+
+
+class SpeciesThreshold(object):
+    '''stop when the molecular number of a chemical species reaches a threshold'''
+
+    def __init__(self, index, threshold, below=True):
+        self.index=index
+        self.threshold=threshold
+        self.below=below
+
+
+    def __call__(self, species, t, nfired):
+        count=np.asarray(species)[...,self.index]
+        if self.below:
+            return count<=self.threshold
+        return count>=self.threshold
+
+
+
+class ReactionCount(object):
+    '''stop when a given number of reactions has occurred'''
+
+    def __init__(self, count):
+        self.count=count
+
+
+    def __call__(self, species, t, nfired):
+        return np.asarray(nfired)>=self.count
+
+
+
+class Predicate(object):
+    '''stop when an arbitrary vectorized function of the state returns True
+
+    function(species, t) has to accept a state of shape (..., number of species) and return a
+    boolean (array) of shape (...)'''
+
+    def __init__(self, function):
+        self.function=function
+
+
+    def __call__(self, species, t, nfired):
+        return self.function(np.asarray(species),t)
+
+
+
+class AnyCondition(object):
+    '''stop when any of the given stop conditions is reached'''
+
+    def __init__(self, condition_list):
+        self.condition_list=condition_list
+
+
+    def __call__(self, species, t, nfired):
+        stop=self.condition_list[0](species,t,nfired)
+        for i in self.condition_list[1:]:
+            stop=stop|i(species,t,nfired)
+        return stop
+
+
+
+def firstpassage(initialspecies_list,reconstant_list,t2,n,stop,seed=0,reactant_matrix=None,change_matrix=None):
+    '''Use the Direct Method to simulate n trajectories at once until each one reaches the stop condition
+
+    All trajectories are stepped together with array operations; a trajectory is taken out of
+    the batch as soon as it reaches the stop condition, reaches equilibrium or passes t2, so no
+    time is spent on the tail after the event of interest.
+
+    parameters
+    ----------
+    initialspecies_list: list
+      molecular number of all the chemical species at time 0
+    reconstant_list: list
+      reaction constants of the reactions
+    t2: float
+      ending time
+    n: int
+      number of trajectories
+    stop: function
+      stop condition stop(species, t, nfired) accepting a batch of states
+    seed: int
+      seed of the random number generator
+    reactant_matrix, change_matrix: np.array
+      model matrices, the 5 reactions of Gibson et al are used if not given
+
+    Returns
+    -------
+    out: tuple with 3 elements
+       first element: np.array of boolean with shape (n,)
+            whether each trajectory reached the stop condition before t2
+       second element: np.array with shape (n,)
+            hitting time of each trajectory (np.inf if it did not reach the stop condition)
+       third element: np.array with shape (n, number of species)
+            hitting state of each trajectory (the state at t2 or at equilibrium if it did not reach the stop condition)
+    '''
+
+    if reactant_matrix is None:
+        reactant_matrix, change_matrix=gibsonmodel()
+    reconstant_list=np.asarray(reconstant_list,dtype=float)
+    rng=np.random.default_rng(seed)
+
+    species=np.tile(np.asarray(initialspecies_list,dtype=np.int64),(n,1))
+    t=np.zeros(n)
+    nfired=np.zeros(n,dtype=np.int64)
+    hit=np.asarray(stop(species,t,nfired),dtype=bool).copy()
+    active=np.flatnonzero(~hit)        # index of the trajectories still running
+
+    while len(active)>0:
+        state=species[active]
+        prop=reconstant_list*np.prod(state[:,None,:]**reactant_matrix,axis=2)
+        cumprop=np.cumsum(prop,axis=1)
+        sumprop=cumprop[:,-1]
+
+        with np.errstate(divide='ignore'):
+            tau=rng.exponential(size=len(active))/sumprop    # np.inf at equilibrium
+        running=t[active]+tau<=t2                            # equilibrium or next reaction after t2: finished
+        active=active[running]
+        if len(active)==0:
+            break
+        cumprop=cumprop[running]
+        u=(cumprop<rng.random(len(active))[:,None]*cumprop[:,-1:]).sum(axis=1)   # choose the reaction
+
+        species[active]+=change_matrix[u]
+        t[active]+=tau[running]
+        nfired[active]+=1
+
+        reached=np.asarray(stop(species[active],t[active],nfired[active]),dtype=bool)
+        hit[active[reached]]=True
+        active=active[~reached]
+
+    hittime=np.where(hit,t,np.inf)
+    return hit, hittime, species
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Next Subvolume Method: the Gibson et al system in many coupled subvolumes with diffusion
+Python 3
+
+"""
+
+
+
+import numpy as np
+from gibson import loadscript
+
+
+# the chemical species and reactions are the objects of the Direct Method OOP script
+_oop=loadscript('1.1. Gibson Direct Method_OOP.py')
+ChemicalSpecies=_oop.ChemicalSpecies
+Reaction=_oop.Reaction
+
+
+
+class IndexedPriorityQueue(object):
+    '''define the indexed priority queue of Gibson et al: a binary heap of event times which
+    also knows where each subvolume is in the heap, so that the time of any subvolume can be
+    changed in O(log n)'''
+
+    def __init__(self, time_list):
+        self.time=list(time_list)
+        self.heap=sorted(range(len(self.time)),key=lambda i: self.time[i])   # a sorted list is a valid heap
+        self.position=[0]*len(self.time)
+        for p,i in enumerate(self.heap):
+            self.position[i]=p
+
+
+    def top(self):
+        '''give the subvolume with the smallest event time and its time'''
+        i=self.heap[0]
+        return i, self.time[i]
+
+
+    def update(self, i, newtime):
+        '''change the event time of subvolume i and restore the heap order'''
+        oldtime=self.time[i]
+        self.time[i]=newtime
+        if newtime<oldtime:
+            self._siftup(self.position[i])
+        else:
+            self._siftdown(self.position[i])
+
+
+    def _swap(self, p, q):
+        heap=self.heap
+        heap[p],heap[q]=heap[q],heap[p]
+        self.position[heap[p]]=p
+        self.position[heap[q]]=q
+
+
+    def _siftup(self, p):
+        while p>0:
+            parent=(p-1)//2
+            if self.time[self.heap[p]]<self.time[self.heap[parent]]:
+                self._swap(p,parent)
+                p=parent
+            else:
+                break
+
+
+    def _siftdown(self, p):
+        n=len(self.heap)
+        while True:
+            child=2*p+1
+            if child>=n:
+                break
+            if child+1<n and self.time[self.heap[child+1]]<self.time[self.heap[child]]:
+                child+=1
+            if self.time[self.heap[child]]<self.time[self.heap[p]]:
+                self._swap(p,child)
+                p=child
+            else:
+                break
+
+
+
+def gridneighbour(shape):
+    '''Give the neighbouring subvolumes of a 1, 2 or 3 dimensional grid of subvolumes
+
+    parameters
+    ----------
+    shape: tuple
+      number of subvolumes along each dimension
+
+    Returns
+    -------
+    out: list
+       list of np.array, the index of the neighbours of each subvolume
+    '''
+
+    nvoxel=int(np.prod(shape))
+    index=np.arange(nvoxel).reshape(shape)
+    neighbour_list=[[] for i in range(nvoxel)]
+    for axis in range(len(shape)):
+        lower=np.take(index,range(shape[axis]-1),axis=axis).ravel()    # each pair of subvolumes next to each other
+        upper=np.take(index,range(1,shape[axis]),axis=axis).ravel()    # along this axis
+        for i,j in zip(lower,upper):
+            neighbour_list[i].append(j)
+            neighbour_list[j].append(i)
+    return [np.array(i,dtype=np.int64) for i in neighbour_list]
+
+
+
+class SpatialSystem(object):
+    '''define the class of a chemical system in many subvolumes coupled by diffusion
+
+    Every subvolume has the reactions of reaction_list (the same reactions as System), and a
+    molecule of species s hops to each neighbouring subvolume with rate diffusion_dic[s].'''
+
+    def __init__(self, reaction_list, chemical_list, shape, diffusion_dic, initialcount=None):
+        self.reaction_list=reaction_list
+        self.chemical_list=chemical_list
+        self.shape=tuple(np.atleast_1d(shape))
+        self.neighbour_list=gridneighbour(self.shape)
+        nvoxel=len(self.neighbour_list)
+
+        name_list=[i.name for i in chemical_list]
+        self.reactant_matrix=np.zeros((len(reaction_list),len(chemical_list)),dtype=np.int64)
+        self.change_matrix=np.zeros((len(reaction_list),len(chemical_list)),dtype=np.int64)
+        for r,rx in enumerate(reaction_list):        # compile the reactions into arrays once
+            for i in rx.reactant_list:
+                self.reactant_matrix[r,name_list.index(i.name)]=rx.coefficient_dic[i.name]
+                self.change_matrix[r,name_list.index(i.name)]-=rx.coefficient_dic[i.name]
+            for j in rx.product_list:
+                self.change_matrix[r,name_list.index(j.name)]+=rx.coefficient_dic[j.name]
+        self.reconstant_list=np.array([rx.reaction_constant for rx in reaction_list],dtype=float)
+        self.diffusion_list=np.array([diffusion_dic.get(i,0.0) for i in name_list],dtype=float)
+
+        if initialcount is None:                     # by default every subvolume starts from the counts of chemical_list
+            initialcount=np.tile([i.count for i in chemical_list],(nvoxel,1))
+        self.initialcount=np.array(initialcount,dtype=np.int64).reshape(nvoxel,len(chemical_list))
+
+
+    def voxelrate(self, count, degree):
+        '''calculate the reaction propensities and the diffusion rates of one subvolume'''
+        prop=self.reconstant_list*np.prod(count**self.reactant_matrix,axis=1)
+        diffrate=self.diffusion_list*count*degree
+        return prop, diffrate
+
+
+    def simulate(self, end_time, t_grid=None, seed=0, stop=None):
+        '''Stimulate the reactions and diffusion from time 0 to end_time with the Next Subvolume Method
+
+        stop(total, t, nfired) is an optional stop condition called on the initial state and after each
+        reaction with the total count of each species over all the subvolumes and the number of reactions
+        (diffusion hops change neither); once it returns True the hitting state is held.
+
+        Returns the molecular count of each species in each subvolume at the time points of t_grid
+        (shape (len(t_grid), number of subvolumes, number of species)) and the number of events.'''
+
+        rng=np.random.default_rng(seed)
+        if t_grid is None:
+            t_grid=[end_time]
+        count=self.initialcount.copy()
+        nvoxel=len(count)
+        degree=np.array([len(i) for i in self.neighbour_list])
+
+        prop=np.empty((nvoxel,len(self.reconstant_list)))
+        diffrate=np.empty(count.shape)
+        for v in range(nvoxel):
+            prop[v],diffrate[v]=self.voxelrate(count[v],degree[v])
+        totalrate=prop.sum(axis=1)+diffrate.sum(axis=1)
+        with np.errstate(divide='ignore'):
+            queue=IndexedPriorityQueue(rng.exponential(size=nvoxel)/totalrate)
+
+        state_grid=np.empty((len(t_grid),nvoxel,count.shape[1]),dtype=np.int64)
+        g=0                               # index of the next time point in t_grid to be recorded
+        nevent=0
+        nfired=0
+        total=count.sum(axis=0)           # count of each species over all the subvolumes, for the stop condition
+        if stop is not None and stop(total,0.0,nfired):
+            state_grid[:]=count
+            return state_grid, nevent
+
+        while True:
+            v,t=queue.top()               # the subvolume with the next event
+            while g<len(t_grid) and t_grid[g]<min(t,end_time):
+                state_grid[g]=count
+                g+=1
+            if t>end_time:                # np.inf if no event can occur in any subvolume
+                break
+
+            sumprop=prop[v].sum()
+            r=rng.random()*totalrate[v]
+            if r<sumprop:                 # a reaction occurs in subvolume v
+                u=min(np.searchsorted(np.cumsum(prop[v]),r,side='right'),len(prop[v])-1)
+                count[v]+=self.change_matrix[u]
+                total+=self.change_matrix[u]
+                nfired+=1
+                changed=[v]
+            else:                         # a molecule of species s hops from v to a random neighbour w
+                s=min(np.searchsorted(np.cumsum(diffrate[v]),r-sumprop,side='right'),count.shape[1]-1)
+                w=self.neighbour_list[v][rng.integers(degree[v])]
+                count[v,s]-=1
+                count[w,s]+=1
+                changed=[v,w]
+            nevent+=1
+
+            for i in changed:             # only the subvolumes whose counts changed get a new event time
+                prop[i],diffrate[i]=self.voxelrate(count[i],degree[i])
+                totalrate[i]=prop[i].sum()+diffrate[i].sum()
+                queue.update(i,t+rng.exponential()/totalrate[i] if totalrate[i]>0 else np.inf)
+            if r<sumprop and stop is not None and stop(total,t,nfired):
+                break
+
+        state_grid[g:]=count              # hold the last state for the remaining time points
+        return state_grid, nevent
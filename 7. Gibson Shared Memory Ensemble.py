@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Ensembles of the Gibson et al system in parallel processes, with the results in shared memory
+Python 3
+
+"""
+
+
+
+import numpy as np
+import multiprocessing
+from multiprocessing import shared_memory
+from gibson import gibsonmodel, ScriptFunction
+
+
+def sharedarray(array):
+    '''Copy an array into a new block of shared memory
+
+    Returns
+    -------
+    out: tuple with 3 elements
+       first element: SharedMemory
+            the shared memory block (the caller has to close and unlink it)
+       second element: np.array
+            view of the array in the shared memory
+       third element: tuple
+            (name, shape, dtype) describing the array, used by attach() in the other processes
+    '''
+
+    array=np.asarray(array)
+    shm=shared_memory.SharedMemory(create=True,size=max(array.nbytes,1))
+    view=np.ndarray(array.shape,dtype=array.dtype,buffer=shm.buf)
+    view[...]=array
+    return shm, view, (shm.name,array.shape,array.dtype.str)
+
+
+def attach(description, writeable=True):
+    '''Give a view of an array created by sharedarray() in another process
+
+    Returns
+    -------
+    out: tuple with 2 elements
+       first element: SharedMemory
+            the shared memory block (keep a reference as long as the view is used)
+       second element: np.array
+            view of the array, without any copy
+    '''
+
+    name,shape,dtype=description
+    try:                                       # the block belongs to the parent, which unlinks it
+        shm=shared_memory.SharedMemory(name=name,track=False)     # Python >= 3.13
+    except TypeError:                          # older Python: the worker processes share the resource tracker
+        shm=shared_memory.SharedMemory(name=name)                 # of the parent, which unlinks the block only once
+    view=np.ndarray(shape,dtype=np.dtype(dtype),buffer=shm.buf)
+    view.flags.writeable=writeable
+    return shm, view
+
+
+_worker={}      # shared memory blocks and views attached by each worker process
+
+
+def _initworker(model_dic, result_description, stop):
+    '''attach the compiled model (read-only) and the result array once per worker process'''
+    for key,description in model_dic.items():
+        _worker[key]=attach(description,writeable=False)
+    _worker['result']=attach(result_description)
+    _worker['stop']=stop
+
+
+def _runbatch(batch):
+    '''simulate the trajectories first..last-1 and write their states straight into the shared result'''
+    first,last,seed,t2=batch
+    reactant_matrix=_worker['reactant'][1]
+    change_matrix=_worker['change'][1]
+    reconstant_list=_worker['reconstant'][1]
+    initial=_worker['initial'][1]
+    t_grid=_worker['grid'][1]
+    result=_worker['result'][1]
+    for i in range(first,last):
+        windowstate(initial,reconstant_list,t2,t_grid,seed+i,reactant_matrix,change_matrix,result[i],_worker['stop'])
+    return last-first
+
+
+def windowstate(initialspecies_list,reconstant_list,t2,t_grid,seed,reactant_matrix,change_matrix,out,stop=None):
+    '''Use the Direct Method to simulate one trajectory and write its state at each time point of t_grid into out
+
+    parameters
+    ----------
+    initialspecies_list: np.array
+      molecular number of all the chemical species at time 0
+    reconstant_list: np.array
+      reaction constants of the reactions
+    t2: float
+      ending time
+    t_grid: np.array
+      time points at which the state is recorded (the state just before each time point, as in repeat())
+    seed: int
+      seed of the random number generator of this trajectory
+    reactant_matrix, change_matrix: np.array
+      model matrices
+    out: np.array with shape (len(t_grid), number of species)
+      where the states are written
+    stop: function (optional)
+      stop(species, t, nfired) is called on the initial state and after each reaction step; once it
+      returns True the hitting state is written for the remaining time points
+    '''
+
+    rng=np.random.default_rng(seed)
+    species=np.array(initialspecies_list,dtype=np.int64)
+    t=0.0
+    g=0
+    nfired=0
+    if stop is not None and stop(species,t,nfired):    # the initial state is already the hitting state
+        out[:]=species
+        return
+    while True:
+        prop=reconstant_list*np.prod(species**reactant_matrix,axis=1)
+        sumprop=prop.sum()
+        tau=rng.exponential(1/sumprop) if sumprop>0 else np.inf
+        while g<len(t_grid) and t_grid[g]<t+tau:    # record the state before the reaction occurs
+            out[g]=species
+            g+=1
+        if t+tau>t2:                   # equilibrium, or the next reaction occurs after t2
+            break
+        t+=tau
+        u=min(np.searchsorted(np.cumsum(prop),rng.random()*sumprop,side='right'),len(prop)-1)
+        species+=change_matrix[u]
+        nfired+=1
+        if stop is not None and stop(species,t,nfired):
+            break
+    out[g:]=species                    # hold the last state for the remaining time points
+
+
+
+class SharedEnsemble(object):
+    '''define the class of an ensemble run in parallel processes
+
+    The compiled model is put in shared memory once and attached read-only by every worker, and
+    the workers write the states (ensemble x time points x species) straight into a preallocated
+    shared array, so nothing is pickled back to the parent. An optional stop condition (see windowstate())
+    is handed to every worker. Use it as a context manager (or call close()) to free the shared memory.'''
+
+    def __init__(self, initialspecies_list, reconstant_list, t2, m, n, reactant_matrix=None, change_matrix=None, stop=None):
+        if reactant_matrix is None:
+            reactant_matrix, change_matrix=gibsonmodel()
+        self.t2=t2
+        self.n=n
+        self.stop=stop
+        self.t_grid=np.linspace(0,t2,m)
+
+        self._shm_list=[]
+        self.model_dic={}
+        for key,array in [('reactant',np.asarray(reactant_matrix,dtype=np.int64)),
+                          ('change',np.asarray(change_matrix,dtype=np.int64)),
+                          ('reconstant',np.asarray(reconstant_list,dtype=float)),
+                          ('initial',np.asarray(initialspecies_list,dtype=np.int64)),
+                          ('grid',self.t_grid)]:
+            shm,view,description=sharedarray(array)
+            self._shm_list.append(shm)
+            self.model_dic[key]=description
+
+        shm,self.result,self.result_description=sharedarray(np.zeros((n,m,len(initialspecies_list)),dtype=np.int64))
+        self._shm_list.append(shm)
+
+
+    def run(self, processes=None, batchsize=None, seed=0):
+        '''simulate the n trajectories (trajectory i uses seed+i) and give a view of the shared result'''
+        processes=processes or multiprocessing.cpu_count()
+        batchsize=batchsize or max(1,self.n//(4*processes))
+        batch_list=[(i,min(i+batchsize,self.n),seed,self.t2) for i in range(0,self.n,batchsize)]
+
+        # the worker functions are sent as ScriptFunction, so that they can be found whatever the start method
+        with multiprocessing.Pool(processes,initializer=ScriptFunction(__file__,'_initworker'),
+                                  initargs=(self.model_dic,self.result_description,self.stop)) as pool:
+            for i in pool.imap_unordered(ScriptFunction(__file__,'_runbatch'),batch_list):
+                pass
+        return self.result
+
+
+    def close(self):
+        '''free the shared memory; the result view must not be used afterwards (copy it first if needed)'''
+        self.result=None
+        for shm in self._shm_list:
+            shm.close()
+            shm.unlink()
+        self._shm_list=[]
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Direct Method stepping core with preallocated state, propensity and event buffers
+Python 3
+
+"""
+
+
+
+import math
+import numpy as np
+from gibson import gibsonmodel
+
+
+class EventBuffer(object):
+    '''define the class of a growable record of reaction events
+
+    The times and the indexes of the reactions are written into preallocated NumPy arrays whose
+    capacity doubles when they are full, so appending an event costs O(1) amortized and does
+    not create any new object.'''
+
+    def __init__(self, capacity=1024):
+        self.time=np.empty(capacity)
+        self.reaction=np.empty(capacity,dtype=np.int32)
+        self.size=0
+
+
+    def append(self, t, u):
+        '''record that reaction u occurred at time t'''
+        if self.size==len(self.time):
+            self._grow()
+        self.time[self.size]=t
+        self.reaction[self.size]=u
+        self.size+=1
+
+
+    def _grow(self):
+        capacity=2*len(self.time)
+        time=np.empty(capacity)
+        reaction=np.empty(capacity,dtype=np.int32)
+        time[:self.size]=self.time[:self.size]
+        reaction[:self.size]=self.reaction[:self.size]
+        self.time=time
+        self.reaction=reaction
+
+
+    def clear(self):
+        '''forget the recorded events but keep the allocated capacity'''
+        self.size=0
+
+
+    def times(self):
+        '''give a view of the recorded reaction times'''
+        return self.time[:self.size]
+
+
+    def reactions(self):
+        '''give a view of the indexes of the recorded reactions'''
+        return self.reaction[:self.size]
+
+
+    def states(self, initialspecies_list, change_matrix):
+        '''rebuild the molecular number of the chemical species after each recorded event'''
+        return np.asarray(initialspecies_list)+np.cumsum(change_matrix[self.reactions()],axis=0)
+
+
+
+class SteppingCore(object):
+    '''define the class of a Direct Method simulator which does not allocate while stepping
+
+    The state, the propensities and their running sums live in arrays allocated once. After a
+    reaction only the propensities depending on the species it changed are recomputed (the
+    dependency graph of Gibson et al), the uniform random numbers are drawn in blocks into a
+    reused buffer, and the events go into an EventBuffer.'''
+
+    def __init__(self, initialspecies_list, reconstant_list, reactant_matrix=None, change_matrix=None,
+                 seed=0, blocksize=4096):
+        if reactant_matrix is None:
+            reactant_matrix, change_matrix=gibsonmodel()
+        self.reactant_matrix=np.asarray(reactant_matrix)
+        self.change_matrix=np.asarray(change_matrix,dtype=np.int64)
+        self.reconstant_list=[float(k) for k in reconstant_list]
+        nreaction,nspecies=self.reactant_matrix.shape
+
+        # (species index, power) of the reactants of each reaction, and the species changed by each reaction
+        self.reactant_list=[[(int(i),int(p)) for i,p in zip(np.flatnonzero(row),row[row!=0])]
+                            for row in self.reactant_matrix]
+        self.update_list=[[(int(i),int(c)) for i,c in zip(np.flatnonzero(row),row[row!=0])]
+                          for row in self.change_matrix]
+        self.dependency_list=[[r for r in range(nreaction)
+                               if any(self.reactant_matrix[r,i]!=0 for i,c in self.update_list[u])]
+                              for u in range(nreaction)]
+
+        self.rng=np.random.default_rng(seed)
+        self.uniform=np.empty(blocksize)
+        self.next=blocksize               # index of the next unused random number in self.uniform
+
+        self.species=np.empty(nspecies,dtype=np.int64)
+        self.prop=np.empty(nreaction)
+        self.cumprop=np.empty(nreaction)
+        self.events=EventBuffer()
+        self.reset(initialspecies_list)
+
+
+    def reset(self, initialspecies_list, start_time=0.0):
+        '''start a new trajectory from initialspecies_list, reusing all the buffers'''
+        self.species[:]=initialspecies_list
+        self.t=start_time
+        for r in range(len(self.prop)):
+            self.prop[r]=self.propensity(r)
+        self.events.clear()
+
+
+    def propensity(self, r):
+        '''calculate the propensity of reaction r from the current state'''
+        k=self.reconstant_list[r]
+        species=self.species
+        for i,p in self.reactant_list[r]:
+            k*=species[i]**p
+        return k
+
+
+    def random(self):
+        '''give the next uniform random number in (0,1], refilling the block in place when used up'''
+        if self.next==len(self.uniform):
+            self.rng.random(out=self.uniform)
+            self.next=0
+        u=self.uniform[self.next]
+        self.next+=1
+        return 1.0-u
+
+
+    def step(self):
+        '''simulate one reaction; return the index of the reaction, or -1 at equilibrium'''
+        np.cumsum(self.prop,out=self.cumprop)
+        sumprop=self.cumprop[-1]
+        if sumprop<=0:
+            return -1
+
+        self.t+=-math.log(self.random())/sumprop
+        u=int(self.cumprop.searchsorted((1.0-self.random())*sumprop,side='right'))
+        if u>=len(self.prop):             # guard against rounding at the upper end
+            u=len(self.prop)-1
+
+        species=self.species
+        for i,c in self.update_list[u]:
+            species[i]+=c
+        for r in self.dependency_list[u]:
+            self.prop[r]=self.propensity(r)
+        self.events.append(self.t,u)
+        return u
+
+
+    def simulate(self, end_time, stop=None):
+        '''Stimulate the reactions until end_time, equilibrium or the stop condition stop(species, t, nfired),
+        which is also evaluated on the state before the first step
+
+        Returns
+        -------
+        out: tuple with 3 elements
+           first element: np.array
+                view of the reaction times (valid until the next reset)
+           second element: np.array
+                view of the indexes of the reactions that occurred
+           third element: boolean
+                whether the system has reached equilibrium
+        '''
+
+        equilibrium=False
+        events=self.events
+        if stop is not None and stop(self.species,self.t,events.size):    # the current state is already the hitting state
+            return events.times(), events.reactions(), equilibrium
+        while self.t<end_time:
+            u=self.step()
+            if u<0:
+                equilibrium=True
+                break
+            if self.t>end_time:           # the last reaction occurs after end_time: undo it
+                for i,c in self.update_list[u]:
+                    self.species[i]-=c
+                for r in self.dependency_list[u]:
+                    self.prop[r]=self.propensity(r)
+                events.size-=1
+                self.t=end_time
+                break
+            if stop is not None and stop(self.species,self.t,events.size):
+                break
+        return events.times(), events.reactions(), equilibrium
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+First Reaction Method with array operations, for one trajectory or an ensemble at once
+Python 3
+
+"""
+
+
+
+import numpy as np
+from gibson import gibsonmodel, propensityarray
+
+
+def firstreactionstep(species,reconstant_list,reactant_matrix,rng):
+    '''Use the First Reaction Method to choose the next reaction of one state or of a batch of states
+
+    The putative times of all the reactions (of all the trajectories) are drawn with one call to
+    the random number generator; reactions with zero propensity are masked to np.inf instead of
+    being handled one by one.
+
+    parameters
+    ----------
+    species: np.array
+      molecular number of the chemical species, shape (number of species,) or (number of trajectories, number of species)
+    reconstant_list: np.array
+      reaction constants of the reactions
+    reactant_matrix: np.array
+      power of each chemical species in the propensity of each reaction
+    rng: np.random.Generator
+      random number generator
+
+    Returns
+    -------
+    out: tuple with 2 elements
+       first element: int or np.array
+            index of the reaction with the smallest putative time (of each trajectory)
+       second element: float or np.array
+            the smallest putative time (np.inf when all the propensities are 0: equilibrium)
+    '''
+
+    prop=propensityarray(species,reconstant_list,reactant_matrix)
+    tau_list=np.full(prop.shape,np.inf)
+    np.divide(rng.standard_exponential(prop.shape),prop,out=tau_list,where=prop>0)
+    u=np.argmin(tau_list,axis=-1)
+    tau=np.take_along_axis(tau_list,np.expand_dims(u,-1),axis=-1)[...,0]
+    return u, tau
+
+
+def firstreactionbatch(species,reconstant_list,reactant_matrix,change_matrix,t1,t_grid,t2,rng,stop=None):
+    '''Use the First Reaction Method to advance a 2-D batch of trajectories from t1 to t2
+
+    parameters
+    ----------
+    species: np.array with shape (number of trajectories, number of species)
+      molecular number of the chemical species of each trajectory at t1, updated in place to the state at t2
+    reconstant_list, reactant_matrix, change_matrix: np.array
+      the model
+    t1, t2: float
+      starting and ending time
+    t_grid: np.array
+      time points (between t1 and t2) at which the state is recorded
+    rng: np.random.Generator
+      random number generator
+    stop: function (optional)
+      stop(species, t, nfired) accepting a batch of states (see 5. Gibson First Passage.py), called on the
+      states at t1 and after each reaction step; a trajectory that reaches it is taken out of the batch
+
+    Returns
+    -------
+    out: np.array with shape (number of trajectories, len(t_grid), number of species)
+       molecular number of the chemical species of each trajectory at each time point (the state just
+       before the time point, as in repeat(); the hitting state is held once the stop condition is reached)
+    '''
+
+    n,m=len(species),len(t_grid)
+    state_grid=np.empty((n,m,species.shape[1]),dtype=np.int64)
+    t=np.full(n,float(t1))
+    g=np.zeros(n,dtype=np.int64)        # index of the next time point to be recorded for each trajectory
+    nfired=np.zeros(n,dtype=np.int64)
+    active=np.arange(n)                 # index of the trajectories still running
+    if stop is not None:
+        active=active[~np.asarray(stop(species,t,nfired),dtype=bool)]
+
+    while len(active)>0:
+        u,tau=firstreactionstep(species[active],reconstant_list,reactant_matrix,rng)
+        tnext=t[active]+tau
+
+        while True:                     # record the state before the reaction occurs at the time points passed
+            due=g[active]<m
+            due[due]=t_grid[g[active][due]]<tnext[due]
+            if not due.any():
+                break
+            i=active[due]
+            state_grid[i,g[i]]=species[i]
+            g[i]+=1
+
+        running=tnext<=t2               # equilibrium or next reaction after t2: the trajectory is finished
+        active=active[running]
+        species[active]+=change_matrix[u[running]]
+        t[active]=tnext[running]
+        if stop is not None:
+            nfired[active]+=1
+            reached=np.asarray(stop(species[active],t[active],nfired[active]),dtype=bool)
+            active=active[~reached]
+
+    held=np.arange(m)>=g[:,None]        # hold the last state for the remaining time points
+    state_grid[held]=np.broadcast_to(species[:,None,:],state_grid.shape)[held]
+    return state_grid
+
+
+def firstreactionensemble(initialspecies_list,reconstant_list,t2,m,n,seed=0,reactant_matrix=None,change_matrix=None,stop=None):
+    '''Use the First Reaction Method to simulate n trajectories from time 0 to t2 as one 2-D batch
+
+    parameters
+    ----------
+    initialspecies_list: list
+      molecular number of all the chemical species at time 0
+    reconstant_list: list
+      reaction constants of the reactions
+    t2: float
+      ending time
+    m: int
+      number of evenly spaced time points from 0 to t2 at which the state is recorded
+    n: int
+      number of trajectories
+    seed: int
+      seed of the random number generator
+    reactant_matrix, change_matrix: np.array
+      model matrices, the 5 reactions of Gibson et al are used if not given
+    stop: function (optional)
+      stop condition, see firstreactionbatch()
+
+    Returns
+    -------
+    out: tuple with 2 elements
+       first element: np.array with shape (m,)
+            the time points
+       second element: np.array with shape (n, m, number of species)
+            molecular number of the chemical species of each trajectory at each time point
+            (the state just before the time point, as in repeat(); the hitting state is held once
+            the stop condition is reached)
+    '''
+
+    if reactant_matrix is None:
+        reactant_matrix, change_matrix=gibsonmodel()
+    t_grid=np.linspace(0,t2,m)
+    species=np.tile(np.asarray(initialspecies_list,dtype=np.int64),(n,1))
+    state_grid=firstreactionbatch(species,np.asarray(reconstant_list,dtype=float),reactant_matrix,change_matrix,
+                                  0.0,t_grid,t2,np.random.default_rng(seed),stop)
+    return t_grid, state_grid
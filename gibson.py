@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+The system with 5 reactions in Gibson et al, shared by the numbered scripts
+Python 3
+
+"""
+
+
+
+import os
+import re
+import sys
+import importlib.abc
+import importlib.util
+import numpy as np
+
+
+fixed_list=[6,14,8,12,9,3,5]    # initial molecular number of the 7 chemical species (A~G), the same as in repeat()
+
+
+def gibsonmodel():
+    '''Give the reactant and change matrices of the system with 5 reactions in Gibson et al
+
+    Returns
+    -------
+    out: tuple with 2 elements
+       first element: np.array with shape (5,7)
+            power of each chemical species (A~G) in the propensity of each reaction
+       second element: np.array with shape (5,7)
+            change of the molecular number of each chemical species after each reaction has occurred once
+    '''
+
+    reactant_matrix=np.zeros((5,7),dtype=int)
+    change_matrix=np.zeros((5,7),dtype=int)
+
+    reactant_matrix[0,[0,1]]=1;  change_matrix[0,[0,1,2]]=[-1,-1,1]     # reaction 1: A+B->C
+    reactant_matrix[1,[1,2]]=1;  change_matrix[1,[1,2,3]]=[-1,-1,1]     # reaction 2: B+C->D
+    reactant_matrix[2,[3,4]]=1;  change_matrix[2,[3,5]]=[-1,1]          # reaction 3: D+E->E+F
+    reactant_matrix[3,[5]]=1;    change_matrix[3,[5,3,6]]=[-1,1,1]      # reaction 4: F->D+G
+    reactant_matrix[4,[4,6]]=1;  change_matrix[4,[4,6,0]]=[-1,-1,1]     # reaction 5: E+G->A
+
+    return reactant_matrix, change_matrix
+
+
+def propensityarray(species, reconstant_list, reactant_matrix):
+    '''Calculate the propensity of every reaction at once
+
+    parameters
+    ----------
+    species: np.array
+      molecular number of the chemical species, shape (number of species,) for one state or
+      (number of trajectories, number of species) for a batch of states
+    reconstant_list: np.array
+      reaction constants of the reactions
+    reactant_matrix: np.array
+      power of each chemical species in the propensity of each reaction
+
+    Returns
+    -------
+    out: np.array
+       propensity of each reaction (of each trajectory)
+    '''
+
+    return reconstant_list*np.prod(species[...,None,:]**reactant_matrix,axis=-1)
+
+
+_scriptdir=os.path.dirname(os.path.abspath(__file__))
+
+
+def scriptmodule(path):
+    '''Give the module name under which a numbered script is loaded ("1.1. Gibson Direct Method_OOP.py"
+    gives "gibson_1_1_gibson_direct_method_oop")'''
+
+    return 'gibson_'+re.sub(r'\W+','_',os.path.splitext(os.path.basename(path))[0]).strip('_').lower()
+
+
+
+class ScriptLoader(importlib.abc.Loader):
+    '''define the loader running a numbered script as a module
+
+    The first scripts were written in a notebook: their IPython magic lines (%matplotlib inline)
+    are blanked before the script is run, so the line numbers do not change.'''
+
+    def __init__(self, path):
+        self.path=path
+
+
+    def create_module(self, spec):
+        return None
+
+
+    def exec_module(self, module):
+        with open(self.path,encoding='utf-8') as f:
+            source=re.sub(r'(?m)^%.*$','',f.read())
+        module.__file__=self.path
+        exec(compile(source,self.path,'exec'),module.__dict__)
+
+
+
+class ScriptFinder(importlib.abc.MetaPathFinder):
+    '''define the finder importing the scripts of this directory by their scriptmodule() name
+
+    A worker process started with spawn or forkserver does not have the scripts loaded by its
+    parent; once gibson is imported there, the objects of these scripts can be unpickled.'''
+
+    def find_spec(self, fullname, path=None, target=None):
+        if not fullname.startswith('gibson_'):
+            return None
+        for name in os.listdir(_scriptdir):
+            if name.endswith('.py') and scriptmodule(name)==fullname:
+                return importlib.util.spec_from_loader(fullname,ScriptLoader(os.path.join(_scriptdir,name)))
+        return None
+
+
+if not any(isinstance(i,ScriptFinder) for i in sys.meta_path):
+    sys.meta_path.append(ScriptFinder())
+
+
+def loadscript(name):
+    '''Load one of the numbered scripts of this repository (their file names are not module names)
+
+    parameters
+    ----------
+    name: str
+      file name of the script in this directory, or a path
+
+    Returns
+    -------
+    out: module
+       the script, loaded once and kept in sys.modules under scriptmodule(name). A worker process can
+       unpickle its objects once gibson has been imported there (see ScriptFunction) if the script is
+       in this directory.
+    '''
+
+    path=os.path.join(_scriptdir,name)
+    modulename=scriptmodule(path)
+    if modulename in sys.modules:
+        return sys.modules[modulename]
+
+    spec=importlib.util.spec_from_loader(modulename,ScriptLoader(path))
+    module=importlib.util.module_from_spec(spec)
+    sys.modules[modulename]=module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[modulename]
+        raise
+    return module
+
+
+
+class ScriptFunction(object):
+    '''define a function of a numbered script that can be sent to worker processes
+
+    It is pickled as the script and function names, and the worker loads the script with
+    loadscript(), so it works whatever the start method of the processes (fork, spawn or forkserver).
+    Pass it as the initializer of a pool so that gibson is imported in the worker before the
+    other objects of the scripts are unpickled.'''
+
+    def __init__(self, name, function):
+        self.name=name
+        self.function=function
+
+
+    def __call__(self, *args, **kwargs):
+        return getattr(loadscript(self.name),self.function)(*args,**kwargs)